@@ -1,12 +1,152 @@
 import functools
 import inspect
+import logging
+import os
+import random
+import time
+import franchises
+import metrics
 import refactor
-from flask import Flask, jsonify, render_template, request, abort
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, jsonify, render_template, request, abort, g
+from flask.json.provider import DefaultJSONProvider
+from caching import ResponseCache
 from database import Database
+from input_validators import validate_integer_input, validate_sqlite_integer
+from summaries import stats_queries
 
 app = Flask(__name__)
-db = Database()
-search_funcs = {'contestants': db.search_contestants, 'episodes': db.search_episodes}
+# 'sqlite' queries drag_race.db directly; 'columnar' answers from an in-memory copy (see columnar.py)
+app.config['DATABASE_BACKEND'] = os.environ.get('DRAG_RACE_BACKEND', 'sqlite')
+# serve the immutable snapshots published by `python database.py --snapshot` instead of the database files; a newly
+# published snapshot is picked up on the next request
+app.config['SNAPSHOTS'] = os.environ.get('DRAG_RACE_SNAPSHOTS') == '1'
+# log the query plan of every search, to check which indexes are used
+app.config['EXPLAIN_QUERIES'] = os.environ.get('DRAG_RACE_EXPLAIN') == '1'
+# profile requests with cProfile, writing the stats to PROFILE_DIR: a random fraction of all requests, and requests
+# sending an `X-Profile: 1` header if PROFILE_HEADER is set
+app.config['PROFILE_SAMPLE_RATE'] = float(os.environ.get('DRAG_RACE_PROFILE_RATE', 0))
+app.config['PROFILE_HEADER'] = os.environ.get('DRAG_RACE_PROFILE_HEADER') == '1'
+app.config['PROFILE_DIR'] = os.environ.get('DRAG_RACE_PROFILE_DIR', 'profiles')
+if app.config['EXPLAIN_QUERIES']:
+    logging.basicConfig()
+    logging.getLogger('database').setLevel(logging.DEBUG)
+if app.config['PROFILE_SAMPLE_RATE'] or app.config['PROFILE_HEADER']:
+    logging.basicConfig()
+    logging.getLogger('metrics').setLevel(logging.INFO)
+# one shard per franchise whose database has been built: its database, query backend, search functions, and cache of
+# encoded /all and /stats responses
+Shard = namedtuple('Shard', ['db', 'backend', 'search_funcs', 'responses'])
+
+
+def get_backend(name: str, database: Database):
+    """
+    Creates the query backend selected in the config
+    :param name: sqlite or columnar
+    :param database: franchise database the backend answers from
+    :return: object providing select_all, search_contestants, search_episodes and search_seasons
+    """
+    if name == 'sqlite':
+        return database
+    if name == 'columnar':
+        from columnar import ColumnarBackend
+        return ColumnarBackend(database)
+    raise ValueError("Unknown database backend: {}".format(name))
+
+
+def open_shard(franchise: str) -> Shard:
+    """
+    Opens the database of a franchise
+    :param franchise: franchise slug, a key of franchises.franchises
+    :return: Shard of the franchise
+    """
+    info = franchises.franchises[franchise]
+    database = Database(info.db_name, explain=app.config['EXPLAIN_QUERIES'], data_dir=info.data_dir,
+                        snapshots=app.config['SNAPSHOTS'])
+    # refuse to start on a file built with an older schema rather than fail its searches
+    database.check_schema()
+    franchise_backend = get_backend(app.config['DATABASE_BACKEND'], database)
+    funcs = {'contestants': franchise_backend.search_contestants, 'episodes': franchise_backend.search_episodes,
+             'seasons': franchise_backend.search_seasons}
+    return Shard(database, franchise_backend, funcs, ResponseCache(database.data_version))
+
+
+# the default franchise is always opened, other franchises only once their database has been built
+built_franchises = franchises.available_franchises()
+shards = {franchise: open_shard(franchise) for franchise in franchises.franchises
+          if franchise == franchises.default_franchise or franchise in built_franchises}
+# the routes without a franchise prefix serve the default franchise
+db, backend, search_funcs, all_responses = shards[franchises.default_franchise]
+# query string parameters of each search, read from the search functions' signatures once at startup
+search_params = {table: tuple(inspect.getfullargspec(func)[0][1:]) for table, func in search_funcs.items()}
+# runs the searches of a cross-franchise search in parallel, one per franchise
+franchise_executor = ThreadPoolExecutor(max_workers=len(shards))
+# most searches one /batch request may contain
+max_batch_size = 100
+# largest page a paginated request may ask for
+max_page_size = 1000
+# names /autocomplete suggests unless the request sets a limit, and the most it may ask for
+default_suggestions = 10
+max_suggestions = 50
+# response types for the `stream` parameter
+stream_formats = {'ndjson': 'application/x-ndjson', 'json': 'application/json'}
+# values of the `format` parameter: rows (the default) for a list of objects, columns for one array per field
+response_formats = ('rows', 'columns')
+
+
+def cache_samples() -> list:
+    """
+    Reads the search and response cache counters for /metrics
+    :return: list of (metric name, labels, value) samples
+    """
+    samples = []
+    for franchise, shard in shards.items():
+        for cache, stats in (('search', shard.db.search_cache.stats()), ('response', shard.responses.stats())):
+            labels = {'cache': cache, 'franchise': franchise}
+            samples += [('cache_hits_total', labels, stats['hits']), ('cache_misses_total', labels, stats['misses']),
+                        ('cache_entries', labels, stats['size'])]
+            if 'evictions' in stats:
+                samples.append(('cache_evictions_total', labels, stats['evictions']))
+    return samples
+
+
+metrics.registry.add_collector(cache_samples)
+
+
+@app.before_request
+def start_request():
+    """
+    Starts timing the request, and profiling it if it was picked for profiling
+    """
+    g.request_start = time.perf_counter()
+    sampled = random.random() < app.config['PROFILE_SAMPLE_RATE']
+    if sampled or (app.config['PROFILE_HEADER'] and request.headers.get('X-Profile') == '1'):
+        g.profile = metrics.start_profile()
+
+
+@app.after_request
+def record_request(response):
+    """
+    Counts the request and records how long it took in the metrics
+    :param response: response to the request
+    :return: `response`
+    """
+    endpoint = request.endpoint or 'not_found'
+    metrics.registry.observe('request_duration_seconds', time.perf_counter() - g.request_start, endpoint=endpoint)
+    metrics.registry.inc('requests_total', endpoint=endpoint, status=response.status_code)
+    return response
+
+
+@app.teardown_request
+def finish_profile(e):
+    """
+    Writes the profile of a profiled request, also if it failed
+    :param e: unhandled exception, if any
+    """
+    profile = g.pop('profile', None)
+    if profile is not None:
+        metrics.dump_profile(profile, app.config['PROFILE_DIR'], request.endpoint or 'not_found')
 
 
 @app.route("/")
@@ -39,26 +179,390 @@ def check_table(func):
     return wrapper_check_table
 
 
+def check_franchise(func):
+    """
+    Decorator that checks if the franchise and table in the route are valid, and passes on the franchise's Shard
+    :param func: function to wrap
+    :return: wrapper function
+    """
+    @functools.wraps(func)
+    def wrapper_check_franchise(franchise, table):
+        if franchise not in shards or table not in search_funcs:
+            abort(404)
+        else:
+            return func(shards[franchise], table)
+    return wrapper_check_franchise
+
+
 @app.route('/all/<table>')
 @check_table
 def get_all(table: str):
     """
-    Get all data from a given table in the database
-    :return: JSON response or 404 if invalid table name is provided
+    Get all data from a given table in the database of the default franchise
+    :return: JSON response, 304 response, or 404 if invalid table name is provided
+    """
+    return all_response(shards[franchises.default_franchise], table)
+
+
+@app.route('/<franchise>/all/<table>')
+@check_franchise
+def get_franchise_all(shard: Shard, table: str):
+    """
+    Get all data from a given table in the database of one franchise
+    :return: JSON response, 304 response, or 404 if invalid franchise or table name is provided
+    """
+    return all_response(shard, table)
+
+
+def all_response(shard: Shard, table: str):
+    """
+    Builds the response with all data from a table. The encoded JSON is cached until the database changes and is
+    served with an ETag, so clients that send If-None-Match get an empty 304 response.
+    :param shard: franchise to read from
+    :param table: database table - contestants, episodes or seasons
+    :return: JSON response or 304 response
+    """
+    limit, after_id, stream = get_page_params()
+    if limit or after_id is not None or stream:
+        return paged_response(table, 'contestants', (), (), limit, after_id, stream, shard.db, get_response_format())
+    response_format = get_response_format()
+    cached = shard.responses.get((table, response_format), lambda: encode_all(table, response_format, shard))
+    if request.if_none_match.contains_weak(cached.etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(cached.body, mimetype=app.json.mimetype)
+    response.set_etag(cached.etag)
+    return response
+
+
+@app.route('/stats/<name>')
+def get_stats(name: str):
+    """
+    Gets precomputed statistics: counts of contestants by hometown or state, ages per season, episodes per season,
+    or challenge wins per contestant. Cached and served with an ETag like /all/<table>.
+    :param name: hometowns, states, ages, episodes or challenge-wins
+    :return: JSON response, 304 response, or 404 if invalid statistic name is provided
+    """
+    return stats_response(shards[franchises.default_franchise], name)
+
+
+@app.route('/<franchise>/stats/<name>')
+def get_franchise_stats(franchise: str, name: str):
     """
-    return jsonify(contestants=refactor.make_list(table, db.select_all(table)))
+    Gets precomputed statistics of one franchise, like /stats/<name>
+    :param franchise: franchise slug
+    :param name: hometowns, states, ages, episodes or challenge-wins
+    :return: JSON response, 304 response, or 404 if invalid franchise or statistic name is provided
+    """
+    if franchise not in shards:
+        abort(404)
+    return stats_response(shards[franchise], name)
+
+
+def stats_response(shard: Shard, name: str):
+    """
+    Builds the response with a precomputed statistic, cached and served with an ETag
+    :param shard: franchise to read from
+    :param name: hometowns, states, ages, episodes or challenge-wins
+    :return: JSON response, 304 response, or 404 if invalid statistic name is provided
+    """
+    if name not in stats_queries:
+        abort(404)
+    cached = shard.responses.get(('stats', name), lambda: encode_stats(name, shard))
+    if request.if_none_match.contains_weak(cached.etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(cached.body, mimetype=app.json.mimetype)
+    response.set_etag(cached.etag)
+    return response
+
+
+@app.route('/metrics')
+def get_metrics():
+    """
+    Serves request, stage, query and cache metrics in the Prometheus text format
+    :return: text response
+    """
+    return app.response_class(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def encode_stats(name: str, shard: Shard = None) -> bytes:
+    """
+    Encodes a statistic as JSON
+    :param name: hometowns, states, ages, episodes or challenge-wins
+    :param shard: franchise to read from; defaults to the default franchise
+    :return: JSON response body
+    """
+    shard = shard or shards[franchises.default_franchise]
+    fields = stats_queries[name][0].split(',')
+    return app.json.response({name: [dict(zip(fields, row)) for row in shard.db.select_stats(name)]}).get_data()
+
+
+def encode_all(table: str, response_format: str = 'rows', shard: Shard = None) -> bytes:
+    """
+    Encodes all data from a given table as JSON
+    :param table: database table - contestants, episodes or seasons
+    :param response_format: rows or columns
+    :param shard: franchise to read from; defaults to the default franchise
+    :return: JSON response body
+    """
+    shard = shard or shards[franchises.default_franchise]
+    return encode_body({'contestants': refactor.Rows(table, shard.backend.select_all(table), response_format)})
+
+
+def fast_json() -> bool:
+    """
+    Checks that the JSON provider writes compact JSON with sorted keys and escaped non-ASCII characters, like
+    refactor.encode_json. It doesn't in debug mode, where Flask indents its JSON.
+    :return: True if responses can be encoded with refactor.encode_json
+    """
+    provider = app.json
+    if type(provider) is not DefaultJSONProvider:
+        return False
+    compact = provider.compact if provider.compact is not None else not app.debug
+    return compact and provider.sort_keys and provider.ensure_ascii
+
+
+def encode_body(data: dict) -> bytes:
+    """
+    Encodes response data as JSON, byte for byte what jsonify returns for it. Rows are encoded straight from the
+    database rows unless the JSON provider is configured differently.
+    :param data: response data, with search results as refactor.Rows
+    :return: JSON response body
+    """
+    if fast_json():
+        start = time.perf_counter()
+        body = (refactor.encode_json(data) + '\n').encode()
+        metrics.registry.observe_stage('jsonify', time.perf_counter() - start)
+        return body
+    start = time.perf_counter()
+    data = refactor.expand_rows(data)
+    metrics.registry.observe_stage('make_list', time.perf_counter() - start)
+    start = time.perf_counter()
+    body = app.json.response(data).get_data()
+    metrics.registry.observe_stage('jsonify', time.perf_counter() - start)
+    return body
+
+
+def json_response(data: dict):
+    """
+    Builds a JSON response like jsonify, encoding the data with encode_body
+    :param data: response data, with search results as refactor.Rows
+    :return: JSON response
+    """
+    return app.response_class(encode_body(data), mimetype=app.json.mimetype)
 
 
 @app.route('/search/<table>')
 @check_table
 def search_api(table: str):
     """
-    Handles search requests to the API
-    :param table: database table - contestants or episodes
+    Handles search requests to the API for the default franchise
+    :param table: database table - contestants, episodes or seasons
     :return: JSON response or 404 if invalid table name is provided
     """
+    return search_response(shards[franchises.default_franchise], table)
+
+
+@app.route('/<franchise>/search/<table>')
+@check_franchise
+def franchise_search_api(shard: Shard, table: str):
+    """
+    Handles search requests to the API for one franchise, which only query that franchise's database
+    :param shard: franchise to search
+    :param table: database table - contestants, episodes or seasons
+    :return: JSON response or 404 if invalid franchise or table name is provided
+    """
+    return search_response(shard, table)
+
+
+def search_response(shard: Shard, table: str):
+    """
+    Runs the search in the request's query string
+    :param shard: franchise to search
+    :param table: database table - contestants, episodes or seasons
+    :return: JSON response
+    """
     args = [request.args.get(param) for param in get_search_params(table)]
-    return do_search(table, *args)
+    limit, after_id, stream = get_page_params()
+    if limit or after_id is not None or stream:
+        conditions, condition_values = shard.db.search_conditions(table, args)
+        if not conditions:
+            return jsonify({table: get_error_message(table)})
+        return paged_response(table, table, conditions, condition_values, limit, after_id, stream, shard.db,
+                              get_response_format())
+    return do_search(table, *args, response_format=get_response_format(), shard=shard)
+
+
+@app.route('/autocomplete')
+def autocomplete():
+    """
+    Suggests contestant names of the default franchise for a partially typed or misspelled name
+    :return: JSON response with the best matching names, best first
+    """
+    return suggest_names(shards[franchises.default_franchise])
+
+
+@app.route('/<franchise>/autocomplete')
+def franchise_autocomplete(franchise: str):
+    """
+    Suggests contestant names of one franchise, like /autocomplete
+    :param franchise: franchise slug
+    :return: JSON response with the best matching names, or 404 if invalid franchise is provided
+    """
+    if franchise not in shards:
+        abort(404)
+    return suggest_names(shards[franchise])
+
+
+def suggest_names(shard: Shard):
+    """
+    Looks up the `name` parameter in the franchise's name index. `limit` caps the number of suggestions; an invalid
+    value is ignored, like invalid search parameters.
+    :param shard: franchise to suggest names from
+    :return: JSON response with the best matching names, best first
+    """
+    limit = validate_integer_input(request.args.get('limit', ''))
+    limit = min(limit, max_suggestions) if limit and limit > 0 else default_suggestions
+    return jsonify({'names': shard.db.name_index.complete(request.args.get('name', ''), limit)})
+
+
+@app.route('/franchises')
+def get_franchises():
+    """
+    Lists the franchises that can be searched
+    :return: JSON response with the slug and name of each franchise
+    """
+    return jsonify({'franchises': [{'franchise': franchise, 'name': franchises.franchises[franchise].name}
+                                   for franchise in shards]})
+
+
+@app.route('/franchises/search/<table>')
+@check_table
+def search_all_franchises(table: str):
+    """
+    Runs a search against every franchise at once. Each franchise is searched in its own database, in parallel, so
+    the response takes about as long as the slowest single-franchise search.
+    :param table: database table - contestants, episodes or seasons
+    :return: JSON response with the matching rows of each franchise, keyed by franchise slug, or 404 if invalid table
+    name is provided
+    """
+    args = [request.args.get(param) for param in get_search_params(table)]
+    return json_response(franchise_search_payload(table, args, get_response_format()))
+
+
+def franchise_search_payload(table: str, args: list, response_format: str = 'rows') -> dict:
+    """
+    Fans a search out to every franchise and merges the results
+    :param table: database table - contestants, episodes or seasons
+    :param args: search parameters to use to supply to the search functions
+    :param response_format: rows or columns
+    :return: dictionary with the franchises that have matching data, or an error message, under the table name
+    """
+    futures = {franchise: franchise_executor.submit(shard.search_funcs[table], *args)
+               for franchise, shard in shards.items()}
+    results = {}
+    for franchise, future in futures.items():
+        search_result = future.result()
+        if search_result:
+            results[franchise] = refactor.Rows(table, search_result, response_format)
+    return {table: results if results else get_error_message(table)}
+
+
+def get_page_params(args: dict = None) -> tuple:
+    """
+    Reads the optional pagination and streaming parameters. `limit` caps the number of rows, `after_id` continues
+    from the `next_after_id` of the previous page, and `stream` (ndjson or json) streams rows from the database cursor.
+    Invalid values are ignored, like invalid search parameters.
+    :param args: query parameters, mapping each name to its first value; defaults to the request's
+    :return: tuple of limit, after_id and stream format, each None if not requested
+    """
+    args = request.args if args is None else args
+    limit = validate_integer_input(args.get('limit', ''))
+    if limit is not None:
+        limit = min(limit, max_page_size) if limit > 0 else None
+    # an ID outside SQLite's range is ignored, since it can't be bound to the query
+    after_id = validate_sqlite_integer(args.get('after_id', ''))
+    stream = args.get('stream')
+    return limit, after_id, stream if stream in stream_formats else None
+
+
+def get_response_format() -> str:
+    """
+    Reads the optional `format` parameter. An invalid value is ignored, like invalid search parameters.
+    :return: rows or columns
+    """
+    response_format = request.args.get('format')
+    return response_format if response_format in response_formats else 'rows'
+
+
+def paged_response(table: str, key: str, conditions: tuple, condition_values: tuple, limit, after_id, stream,
+                   database: Database = None, response_format: str = 'rows'):
+    """
+    Builds a paginated or streamed response, reading rows from the database in ID order. Streams always have one
+    object per row, since the rows are sent before the columns could be filled.
+    :param table: database table - contestants, episodes or seasons
+    :param key: name of the JSON field holding the rows
+    :param conditions: SQL search conditions, empty for all rows
+    :param condition_values: values to bind to the conditions
+    :param limit: maximum number of rows, or None
+    :param after_id: only rows after this ID, or None
+    :param stream: stream format, or None for a single JSON page
+    :param database: franchise database to read from; defaults to the default franchise
+    :param response_format: rows or columns, for a JSON page
+    :return: JSON page with `next_after_id` (null on the last page), or a streamed response
+    """
+    database = database or db
+    if stream:
+        rows = database.iter_rows(table, conditions, condition_values, after_id, limit)
+        return app.response_class(stream_rows(table, key, rows, stream), mimetype=stream_formats[stream])
+    return json_response(page_payload(table, key, conditions, condition_values, limit, after_id, database,
+                                      response_format))
+
+
+def page_payload(table: str, key: str, conditions: tuple, condition_values: tuple, limit, after_id,
+                 database: Database = None, response_format: str = 'rows') -> dict:
+    """
+    Reads one page of rows, in ID order, and builds the data for its JSON response
+    :param table: database table - contestants, episodes or seasons
+    :param key: name of the JSON field holding the rows
+    :param conditions: SQL search conditions, empty for all rows
+    :param condition_values: values to bind to the conditions
+    :param limit: maximum number of rows, or None
+    :param after_id: only rows after this ID, or None
+    :param database: franchise database to read from; defaults to the default franchise
+    :param response_format: rows or columns
+    :return: dictionary with the rows under `key` and `next_after_id` (None on the last page)
+    """
+    database = database or db
+    # fetch one extra row to find out whether there is another page
+    page = list(database.iter_rows(table, conditions, condition_values, after_id, limit + 1 if limit else None))
+    next_after_id = None
+    if limit and len(page) > limit:
+        page = page[:limit]
+        next_after_id = page[-1][0]
+    return {key: refactor.Rows(table, [row for _, row in page], response_format), 'next_after_id': next_after_id}
+
+
+def stream_rows(table: str, key: str, rows, stream: str):
+    """
+    Encodes rows one at a time as they are read from the cursor, so memory use doesn't grow with the result size
+    :param table: database table - contestants, episodes or seasons
+    :param key: name of the JSON field holding the rows, for the json format
+    :param rows: iterator of (row ID, row) tuples
+    :param stream: ndjson for one JSON object per line, json for a single JSON document sent in chunks
+    :return: generator of response chunks
+    """
+    if stream == 'ndjson':
+        for _, row in rows:
+            yield refactor.encode_row(table, row) + '\n'
+        return
+    yield '{{"{}":['.format(key)
+    separator = ''
+    for _, row in rows:
+        yield separator + refactor.encode_row(table, row)
+        separator = ','
+    yield ']}\n'
 
 
 @app.route('/formsearch/<table>', methods=["GET", "POST"])
@@ -66,7 +570,7 @@ def search_api(table: str):
 def form_search(table: str):
     """
     Gets data from HTML form to do a search
-    :param table: database table - contestants or episodes
+    :param table: database table - contestants, episodes or seasons
     :return: for "GET" request, renders form template. For "POST" request, returns JSON response
     """
     if request.method == "POST":
@@ -75,24 +579,87 @@ def form_search(table: str):
     return render_template("form.html", table=table)
 
 
-def do_search(table, *args):
+@app.route('/batch', methods=["POST"])
+def batch_search():
+    """
+    Runs many searches in one request. The body is a JSON array of search specs such as
+    {"table": "contestants", "params": {"season": 4}}, using the same parameters as /search/<table>.
+    :return: JSON response with one result per spec, in the same order, or 400 if the body is invalid
+    """
+    return json_response(batch_payload(request.get_json(silent=True)))
+
+
+def batch_payload(specs) -> dict:
+    """
+    Validates the search specs of a /batch request and runs them, grouping the searches by table
+    :param specs: decoded request body, or None if it wasn't JSON
+    :return: dictionary with one result per spec, in the same order; aborts with 400 if the specs are invalid
+    """
+    if not isinstance(specs, list) or not 0 < len(specs) <= max_batch_size:
+        abort(400, "Expected a JSON array of 1 to {} search specs".format(max_batch_size))
+    arg_lists = {table: [] for table in search_funcs}
+    positions = {table: [] for table in search_funcs}
+    for i, spec in enumerate(specs):
+        if not isinstance(spec, dict) or spec.get('table') not in search_funcs or \
+                not isinstance(spec.get('params', {}), dict):
+            abort(400, "Invalid search spec at position {}".format(i))
+        table = spec['table']
+        params = spec.get('params', {})
+        arg_lists[table].append([None if params.get(param) is None else str(params[param])
+                                 for param in get_search_params(table)])
+        positions[table].append(i)
+    results = [None] * len(specs)
+    for table in search_funcs:
+        if arg_lists[table]:
+            search_results = backend.batch_search(table, arg_lists[table])
+            for i, search_result in zip(positions[table], search_results):
+                results[i] = make_payload(table, search_result)
+    return {'results': results}
+
+
+def do_search(table, *args, response_format: str = 'rows', shard: Shard = None):
     """
     Calls the appropriate database search function, based on the table
-    :param table: database table - contestants or episodes
+    :param table: database table - contestants, episodes or seasons
     :param args: search parameters to use to supply to the search function
+    :param response_format: rows or columns
+    :param shard: franchise to search; defaults to the default franchise
     :return: JSON response with matching data
     """
-    search_result = search_funcs[table](*args)
+    return json_response(search_payload(table, *args, response_format=response_format, shard=shard))
+
+
+def search_payload(table, *args, response_format: str = 'rows', shard: Shard = None) -> dict:
+    """
+    Runs a search and builds the data for its JSON response
+    :param table: database table - contestants, episodes or seasons
+    :param args: search parameters to use to supply to the search function
+    :param response_format: rows or columns
+    :param shard: franchise to search; defaults to the default franchise
+    :return: dictionary with the matching data or an error message under the table name
+    """
+    funcs = shard.search_funcs if shard else search_funcs
+    return make_payload(table, funcs[table](*args), response_format)
+
+
+def make_payload(table: str, search_result, response_format: str = 'rows') -> dict:
+    """
+    Builds the data for the JSON response to one search
+    :param table: database table - contestants, episodes or seasons
+    :param search_result: rows returned by the search function
+    :param response_format: rows or columns
+    :return: dictionary with the matching data, as refactor.Rows, or an error message under the table name
+    """
     if search_result:
-        return jsonify({table: refactor.make_list(table, search_result)})
+        return {table: refactor.Rows(table, search_result, response_format)}
     else:
-        return jsonify({table: get_error_message(table)})
+        return {table: get_error_message(table)}
 
 
 def get_error_message(table: str):
     """
     Creates error message for a given table
-    :param table: database table - contestants or episodes
+    :param table: database table - contestants, episodes or seasons
     :return: error message
     """
     return "Sorry, we couldn't find any {} matching that criteria.".format(table)
@@ -101,10 +668,10 @@ def get_error_message(table: str):
 def get_search_params(table: str):
     """
     Gets supported search parameters for a given table
-    :param table: database table - contestants or episodes
+    :param table: database table - contestants, episodes or seasons
     :return: tuple of search parameters
     """
-    return tuple(inspect.getfullargspec(search_funcs[table])[0][1:])
+    return search_params[table]
 
 
 if __name__ == '__main__':
@@ -0,0 +1,447 @@
+"""Async (ASGI) serving mode for the API. Serves the same routes and JSON as app.py, but runs database work on a
+bounded thread pool so one process can handle many concurrent clients. Run with an ASGI server, e.g.
+`uvicorn asgi:app --workers 1`. Set DRAG_RACE_DB_THREADS to change the size of the thread pool."""
+import asyncio
+import mimetypes
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, Tuple, Union
+from urllib.parse import parse_qs
+
+from flask import render_template
+from werkzeug.exceptions import HTTPException, NotFound
+from werkzeug.http import parse_etags, parse_options_header
+from werkzeug.utils import get_content_type
+
+import app as flask_app
+import metrics
+
+executor = ThreadPoolExecutor(max_workers=int(os.environ.get('DRAG_RACE_DB_THREADS', 8)),
+                              thread_name_prefix='drag-race-db')
+static_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+# encoded chunks of a streamed response that may wait for a slow client before reading more rows stops
+stream_buffer_size = 16
+
+# the body is bytes, or an iterator of str chunks for a streamed response
+Response = Tuple[int, list, Union[bytes, Iterator[str]]]
+# a request matched to an endpoint: the path's rule arguments, parsed query string, headers, body and method
+Request = namedtuple('Request', ['args', 'query', 'headers', 'body', 'method'])
+
+
+async def run_blocking(func: Callable, *args):
+    """
+    Runs blocking work, such as a database query, on the bounded thread pool
+    :param func: function to run
+    :param args: arguments for `func`
+    :return: return value of `func`
+    """
+    return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
+def json_response(data: dict) -> Response:
+    """
+    Encodes data exactly like Flask's jsonify, see app.encode_body
+    :param data: data to encode
+    :return: status, headers and body
+    """
+    return 200, [(b'content-type', flask_app.app.json.mimetype.encode())], flask_app.encode_body(data)
+
+
+def html_response(template: str, status: int = 200, **context) -> Response:
+    """
+    Renders one of the Flask app's templates
+    :param template: template file name
+    :param status: HTTP status code
+    :param context: template variables
+    :return: status, headers and body
+    """
+    with flask_app.app.test_request_context():
+        body = render_template(template, **context).encode()
+    return status, [(b'content-type', b'text/html; charset=utf-8')], body
+
+
+def not_found() -> Response:
+    """
+    Renders the 404 page, like app.page_not_found
+    :return: status, headers and body
+    """
+    return html_response('404.html', 404)
+
+
+def get_all(table: str, values: dict, headers: dict, shard: flask_app.Shard = None) -> Response:
+    """
+    Same as app.all_response, including pagination, streaming, the cached body and If-None-Match handling
+    :param table: database table - contestants, episodes or seasons
+    :param values: parsed parameters, mapping each name to a list of values
+    :param headers: request headers
+    :param shard: franchise to read from; defaults to the default franchise
+    :return: status, headers and body
+    """
+    page_params = get_page_params(values)
+    if any(param is not None for param in page_params):
+        return paged_response(table, 'contestants', (), (), page_params, shard, get_response_format(values))
+    response_format = get_response_format(values)
+    return cached_json((table, response_format), lambda: flask_app.encode_all(table, response_format, shard), headers,
+                       shard)
+
+
+def get_stats(name: str, headers: dict, shard: flask_app.Shard = None) -> Response:
+    """
+    Same as app.stats_response
+    :param name: hometowns, states, ages, episodes or challenge-wins
+    :param headers: request headers
+    :param shard: franchise to read from; defaults to the default franchise
+    :return: status, headers and body
+    """
+    return cached_json(('stats', name), lambda: flask_app.encode_stats(name, shard), headers, shard)
+
+
+def cached_json(key, build: Callable[[], bytes], headers: dict, shard: flask_app.Shard = None) -> Response:
+    """
+    Serves a response body from the franchise's response cache, answering a matching If-None-Match with 304
+    :param key: cache key
+    :param build: function that encodes the response body
+    :param headers: request headers
+    :param shard: franchise whose cache to use; defaults to the default franchise
+    :return: status, headers and body
+    """
+    cached = (shard.responses if shard else flask_app.all_responses).get(key, build)
+    etag_header = [(b'etag', '"{}"'.format(cached.etag).encode())]
+    if parse_etags(headers.get('if-none-match')).contains_weak(cached.etag):
+        return 304, etag_header, b''
+    return 200, [(b'content-type', flask_app.app.json.mimetype.encode())] + etag_header, cached.body
+
+
+def search_response(table: str, values: dict, shard: flask_app.Shard = None) -> Response:
+    """
+    Same as app.search_response, including pagination and streaming
+    :param table: database table - contestants, episodes or seasons
+    :param values: parsed query string, mapping each name to a list of values
+    :param shard: franchise to search; defaults to the default franchise
+    :return: status, headers and body
+    """
+    page_params = get_page_params(values)
+    if any(param is not None for param in page_params):
+        args = [values.get(param, [None])[0] for param in flask_app.get_search_params(table)]
+        conditions, condition_values = (shard.db if shard else flask_app.db).search_conditions(table, args)
+        if not conditions:
+            return json_response({table: flask_app.get_error_message(table)})
+        return paged_response(table, table, conditions, condition_values, page_params, shard,
+                              get_response_format(values))
+    return search(table, values, shard)
+
+
+def paged_response(table: str, key: str, conditions: tuple, condition_values: tuple, page_params: tuple,
+                   shard: flask_app.Shard = None, response_format: str = 'rows') -> Response:
+    """
+    Same as app.paged_response. A streamed body is returned as an iterator of chunks, which `app` sends as they are
+    read from the database cursor.
+    :param table: database table - contestants, episodes or seasons
+    :param key: name of the JSON field holding the rows
+    :param conditions: SQL search conditions, empty for all rows
+    :param condition_values: values to bind to the conditions
+    :param page_params: limit, after_id and stream format, from get_page_params
+    :param shard: franchise to read from; defaults to the default franchise
+    :param response_format: rows or columns, for a JSON page
+    :return: status, headers and body
+    """
+    database = shard.db if shard else flask_app.db
+    limit, after_id, stream = page_params
+    if stream:
+        rows = database.iter_rows(table, conditions, condition_values, after_id, limit)
+        content_type = get_content_type(flask_app.stream_formats[stream], 'utf-8')
+        return 200, [(b'content-type', content_type.encode())], flask_app.stream_rows(table, key, rows, stream)
+    return json_response(flask_app.page_payload(table, key, conditions, condition_values, limit, after_id, database,
+                                                response_format))
+
+
+def search(table: str, values: dict, shard: flask_app.Shard = None) -> Response:
+    """
+    Same as app.do_search, with the search parameters taken from a parsed query string or form
+    :param table: database table - contestants, episodes or seasons
+    :param values: parsed parameters, mapping each name to a list of values
+    :param shard: franchise to search; defaults to the default franchise
+    :return: status, headers and body
+    """
+    args = [values.get(param, [None])[0] for param in flask_app.get_search_params(table)]
+    return json_response(flask_app.search_payload(table, *args, response_format=get_response_format(values),
+                                                  shard=shard))
+
+
+def search_franchises(table: str, values: dict) -> Response:
+    """
+    Same as app.search_all_franchises
+    :param table: database table - contestants, episodes or seasons
+    :param values: parsed parameters, mapping each name to a list of values
+    :return: status, headers and body
+    """
+    args = [values.get(param, [None])[0] for param in flask_app.get_search_params(table)]
+    return json_response(flask_app.franchise_search_payload(table, args, get_response_format(values)))
+
+
+def autocomplete(values: dict, shard: flask_app.Shard = None) -> Response:
+    """
+    Same as app.suggest_names
+    :param values: parsed parameters, mapping each name to a list of values
+    :param shard: franchise to suggest names from; defaults to the default franchise
+    :return: status, headers and body
+    """
+    shard = shard or flask_app.shards[flask_app.franchises.default_franchise]
+    limit = flask_app.validate_integer_input(values.get('limit', [''])[0])
+    limit = min(limit, flask_app.max_suggestions) if limit and limit > 0 else flask_app.default_suggestions
+    return json_response({'names': shard.db.name_index.complete(values.get('name', [''])[0], limit)})
+
+
+def batch(body: bytes, headers: dict) -> Response:
+    """
+    Same as app.batch_search. Invalid search specs raise the same 400 error, which dispatch renders
+    :param body: request body
+    :param headers: request headers
+    :return: status, headers and body
+    """
+    specs = None
+    # like request.get_json(silent=True), only a JSON content type is decoded and an invalid body counts as missing
+    mimetype = parse_options_header(headers.get('content-type', ''))[0].lower()
+    if mimetype == 'application/json' or (mimetype.startswith('application/') and mimetype.endswith('+json')):
+        try:
+            specs = flask_app.app.json.loads(body)
+        except ValueError:
+            pass
+    return json_response(flask_app.batch_payload(specs))
+
+
+def error_response(error: HTTPException) -> Response:
+    """
+    Renders an HTTP error the way Flask does when the app has no handler for it
+    :param error: HTTP error raised by abort
+    :return: status, headers and body
+    """
+    response = error.get_response()
+    # content-length is added when the body is sent
+    headers = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response.headers
+               if name.lower() != 'content-length']
+    return response.status_code, headers, response.get_data()
+
+
+def get_franchises() -> Response:
+    """
+    Same as app.get_franchises
+    :return: status, headers and body
+    """
+    registry = flask_app.franchises.franchises
+    return json_response({'franchises': [{'franchise': franchise, 'name': registry[franchise].name}
+                                         for franchise in flask_app.shards]})
+
+
+def get_page_params(values: dict) -> tuple:
+    """
+    Same as app.get_page_params
+    :param values: parsed parameters, mapping each name to a list of values
+    :return: tuple of limit, after_id and stream format, each None if not requested
+    """
+    return flask_app.get_page_params({name: value[0] for name, value in values.items()})
+
+
+def get_response_format(values: dict) -> str:
+    """
+    Same as app.get_response_format
+    :param values: parsed parameters, mapping each name to a list of values
+    :return: rows or columns
+    """
+    response_format = values.get('format', [None])[0]
+    return response_format if response_format in flask_app.response_formats else 'rows'
+
+
+def static_file(path: str) -> Response:
+    """
+    Serves a file from the static folder
+    :param path: path relative to the static folder
+    :return: status, headers and body
+    """
+    file_path = os.path.normpath(os.path.join(static_dir, path))
+    if not file_path.startswith(static_dir + os.sep) or not os.path.isfile(file_path):
+        return not_found()
+    with open(file_path, 'rb') as fh:
+        body = fh.read()
+    # like Flask's send_from_directory, text types get a charset
+    content_type = get_content_type(mimetypes.guess_type(file_path)[0] or 'application/octet-stream', 'utf-8')
+    return 200, [(b'content-type', content_type.encode())], body
+
+
+def get_metrics() -> Response:
+    """
+    Same as app.get_metrics
+    :return: status, headers and body
+    """
+    return 200, [(b'content-type', b'text/plain; version=0.0.4; charset=utf-8')], metrics.registry.render().encode()
+
+
+async def read_body(receive: Callable) -> bytes:
+    """
+    Reads the whole request body
+    :param receive: ASGI receive callable
+    :return: request body
+    """
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    return body
+
+
+def form_search(request: Request, shard: flask_app.Shard = None) -> Response:
+    """
+    Same as app.form_search
+    :param request: the request
+    :param shard: not used, the form searches the default franchise
+    :return: status, headers and body
+    """
+    if request.method == 'POST':
+        return search(request.args['table'], parse_qs(request.body.decode(), keep_blank_values=True))
+    return html_response('form.html', table=request.args['table'])
+
+
+# the Flask app's endpoints, each called with the Request and, on the franchise routes, the franchise's Shard
+handlers = {
+    'static': lambda request, shard: static_file(request.args['filename']),
+    'home': lambda request, shard: html_response('index.html'),
+    'get_all': lambda request, shard: get_all(request.args['table'], request.query, request.headers, shard),
+    'get_franchise_all': lambda request, shard: get_all(request.args['table'], request.query, request.headers, shard),
+    'get_stats': lambda request, shard: get_stats(request.args['name'], request.headers, shard),
+    'get_franchise_stats': lambda request, shard: get_stats(request.args['name'], request.headers, shard),
+    'get_metrics': lambda request, shard: get_metrics(),
+    'search_api': lambda request, shard: search_response(request.args['table'], request.query, shard),
+    'franchise_search_api': lambda request, shard: search_response(request.args['table'], request.query, shard),
+    'autocomplete': lambda request, shard: autocomplete(request.query, shard),
+    'franchise_autocomplete': lambda request, shard: autocomplete(request.query, shard),
+    'get_franchises': lambda request, shard: get_franchises(),
+    'search_all_franchises': lambda request, shard: search_franchises(request.args['table'], request.query),
+    'form_search': form_search,
+    'batch_search': lambda request, shard: batch(request.body, request.headers),
+}
+
+
+def dispatch(endpoint: str, request: Request) -> Response:
+    """
+    Checks the path's arguments like the Flask routes do, then calls the endpoint's handler, rendering the HTTP errors
+    it raises like the Flask app does
+    :param endpoint: name of the Flask endpoint
+    :param request: the request
+    :return: status, headers and body
+    """
+    args = request.args
+    # the same 404s as app.check_table, app.check_franchise, the franchise routes and app.stats_response
+    if ('table' in args and args['table'] not in flask_app.search_funcs
+            or 'franchise' in args and args['franchise'] not in flask_app.shards
+            or 'name' in args and args['name'] not in flask_app.stats_queries):
+        return not_found()
+    shard = flask_app.shards[args['franchise']] if 'franchise' in args else None
+    try:
+        return handlers[endpoint](request, shard)
+    except HTTPException as e:
+        return error_response(e)
+
+
+async def route(scope: dict, receive: Callable) -> Tuple[str, Response]:
+    """
+    Matches a request against the Flask app's url_map, so both serving modes accept the same paths and methods, and
+    dispatches it to the endpoint's handler
+    :param scope: ASGI connection scope
+    :param receive: ASGI receive callable
+    :return: endpoint name for the metrics, or not_found, and the status, headers and body
+    """
+    method = scope['method']
+    headers = {name.decode('latin-1'): value.decode('latin-1') for name, value in scope['headers']}
+    adapter = flask_app.app.url_map.bind(headers.get('host', 'localhost'), url_scheme=scope.get('scheme', 'http'))
+    try:
+        endpoint, args = adapter.match(scope['path'], method)
+    except NotFound:
+        return 'not_found', await run_blocking(not_found)
+    except HTTPException as e:
+        # 405 with its Allow header, or a redirect to the path with merged slashes
+        return 'not_found', error_response(e)
+    if method == 'OPTIONS':
+        # like Flask's automatic OPTIONS response
+        allow = ', '.join(sorted(adapter.allowed_methods(scope['path']))).encode()
+        return endpoint, (200, [(b'content-type', b'text/html; charset=utf-8'), (b'allow', allow)], b'')
+    query = parse_qs(scope['query_string'].decode(), keep_blank_values=True)
+    body = await read_body(receive) if method == 'POST' else b''
+    return endpoint, await run_blocking(dispatch, endpoint, Request(args, query, headers, body, method))
+
+
+async def send_stream(chunks: Iterator[str], send: Callable):
+    """
+    Sends a streamed body one chunk at a time. The chunks are read on one thread of the pool, which keeps the database
+    cursor on the thread that owns its connection, and handed over through a bounded queue, so a slow client holds
+    back the reading instead of the rows piling up in memory.
+    :param chunks: iterator of response chunks, such as app.stream_rows
+    :param send: ASGI send callable
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=stream_buffer_size)
+    stopped = threading.Event()
+
+    def produce():
+        try:
+            for chunk in chunks:
+                if stopped.is_set():
+                    break
+                asyncio.run_coroutine_threadsafe(queue.put(chunk.encode()), loop).result()
+        finally:
+            chunks.close()
+            asyncio.run_coroutine_threadsafe(queue.put(None), loop).result()
+
+    producer = loop.run_in_executor(executor, produce)
+    chunk = b''
+    try:
+        chunk = await queue.get()
+        while chunk is not None:
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            chunk = await queue.get()
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+    finally:
+        # if the client went away, let the producer finish so its thread is freed
+        stopped.set()
+        while chunk is not None:
+            chunk = await queue.get()
+    await producer
+
+
+async def app(scope: dict, receive: Callable, send: Callable):
+    """
+    ASGI application
+    :param scope: ASGI connection scope
+    :param receive: ASGI receive callable
+    :param send: ASGI send callable
+    """
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+    start = time.perf_counter()
+    endpoint, (status, headers, body) = await route(scope, receive)
+    metrics.registry.observe('request_duration_seconds', time.perf_counter() - start, endpoint=endpoint)
+    metrics.registry.inc('requests_total', endpoint=endpoint, status=status)
+    if not isinstance(body, bytes):
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        if scope['method'] == 'HEAD':
+            body.close()
+            await send({'type': 'http.response.body', 'body': b''})
+        else:
+            await send_stream(body, send)
+        return
+    headers.append((b'content-length', str(len(body)).encode()))
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': b'' if scope['method'] == 'HEAD' else body})
@@ -0,0 +1,558 @@
+"""Benchmarks for the API and database layer. Run from the project root, e.g. `python benchmark.py search`"""
+import argparse
+import functools
+import json
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from typing import Callable
+
+from search_cases import benchmark_searches, run_search
+
+
+def requests_per_second(func: Callable, duration: float) -> float:
+    """
+    Calls `func` repeatedly for roughly `duration` seconds
+    :param func: function to call, taking no arguments
+    :param duration: number of seconds to keep calling `func`
+    :return: number of calls completed per second
+    """
+    calls = 0
+    start = time.perf_counter()
+    end = start + duration
+    while time.perf_counter() < end:
+        func()
+        calls += 1
+    return calls / (time.perf_counter() - start)
+
+
+def bench_search(args: argparse.Namespace):
+    """
+    Compares requests/sec for /search/contestants with a fresh connection per request against pooled connections. The
+    search cache is cleared before every request so each request queries the database.
+    :param args: command line arguments
+    """
+    import app
+    client = app.app.test_client()
+    url = '/search/contestants?season=4'
+
+    def unpooled():
+        # resetting the pool forces a new connection, like the old connect/close per query
+        app.db.pool.reset()
+        app.db.search_cache.clear()
+        client.get(url)
+
+    def pooled():
+        app.db.search_cache.clear()
+        client.get(url)
+
+    for label, func in (('connect per request', unpooled), ('pooled', pooled)):
+        print('{:<22}{:>10.1f} req/s'.format(label, requests_per_second(func, args.duration)))
+
+
+def bench_batch(args: argparse.Namespace):
+    """
+    Compares one /search/contestants request per season against a single /batch request for all seasons. The search
+    cache is cleared before every round so each round queries the database.
+    :param args: command line arguments
+    """
+    import app
+    client = app.app.test_client()
+    seasons = range(1, 14)
+    specs = [{'table': 'contestants', 'params': {'season': season}} for season in seasons]
+
+    def separate():
+        app.db.search_cache.clear()
+        for season in seasons:
+            client.get('/search/contestants?season={}'.format(season))
+
+    def batched():
+        app.db.search_cache.clear()
+        client.post('/batch', json=specs)
+
+    for label, func in (('one request per season', separate), ('batch request', batched)):
+        print('{:<24}{:>10.2f} ms per {} searches'.format(label, 1000 / requests_per_second(func, args.duration),
+                                                          len(specs)))
+
+
+def bench_compile(args: argparse.Namespace):
+    """
+    Measures the Python work done for a search before SQLite runs: binding the parameters to the compiled query
+    against building the SQL for every search, and the precomputed parameter names against calling inspect per request
+    :param args: command line arguments
+    """
+    import inspect
+    import app
+    search_args = ['mon', '3', '5', '20', '40']
+
+    def recompiled():
+        app.db.compiled_searches.clear()
+        app.db.search_conditions('contestants', search_args)
+
+    cases = {'compiled query': lambda: app.db.search_conditions('contestants', search_args),
+             'SQL built every search': recompiled,
+             'precomputed params': lambda: app.get_search_params('contestants'),
+             'inspect every request': lambda: inspect.getfullargspec(app.search_funcs['contestants'])}
+    for label, func in cases.items():
+        print('{:<24}{:>10.2f} us/search'.format(label, 1e6 / requests_per_second(func, args.duration)))
+
+
+def bench_encode(args: argparse.Namespace):
+    """
+    Compares encoding every contestant, repeated to each --scales size, with jsonify against the direct row encoder
+    and the columnar format, and prints the size of each response body
+    :param args: command line arguments
+    """
+    import app
+    import refactor
+    rows = app.db.select_all('contestants')
+    for factor in args.scales:
+        scaled = rows * factor
+        cases = {'jsonify(make_list)': lambda: app.app.json.response(
+                     contestants=refactor.make_list('contestants', scaled)).get_data(),
+                 'encode_body rows': lambda: app.encode_body({'contestants': refactor.Rows('contestants', scaled)}),
+                 'encode_body columns': lambda: app.encode_body(
+                     {'contestants': refactor.Rows('contestants', scaled, 'columns')})}
+        for label, func in cases.items():
+            size = len(func())
+            print('{:>6}x {:<22}{:>10.2f} ms {:>10} bytes'.format(
+                factor, label, 1000 / requests_per_second(func, args.duration), size))
+
+
+# the served database has no SQL name index, since searches match names with the in-memory NameIndex; bench_names
+# adds this FTS5 trigram table to its databases to show what a LIKE search through an index would cost
+trigram_table = '''CREATE VIRTUAL TABLE ContestantNames USING fts5(
+                name, content='Contestants', content_rowid='id', tokenize='trigram')'''
+like_conditions = {'LIKE scan': 'Contestants.name LIKE ?',
+                   'LIKE trigram table': 'Contestants.id IN (SELECT rowid FROM ContestantNames '
+                                         'WHERE ContestantNames.name LIKE ?)'}
+
+
+def bench_names(args: argparse.Namespace):
+    """
+    Compares contestant name searches through the in-memory name index against SQL LIKE conditions, with and without
+    an FTS5 trigram table of the names, on databases of each --scales size. Caches are cleared before every search.
+    :param args: command line arguments
+    """
+    from database import Database
+    from input_validators import add_wildcards
+    queries = ['mon', 'Monsoom', 'sharon needles', 'x']
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for factor in args.scales:
+            db = Database(os.path.join(tmp_dir, 'names_{}.db'.format(factor)))
+            db.contestant_df, db.episode_df = scale_frames(db.contestant_df, db.episode_df, factor)
+            db.create_database()
+            with sqlite3.connect(db.db_name) as conn:
+                conn.execute(trigram_table)
+                conn.execute("INSERT INTO ContestantNames (ContestantNames) VALUES('rebuild')")
+
+            def uncached(func: Callable) -> Callable:
+                def clear_and_call():
+                    db.search_cache.clear()
+                    db.name_index.search.cache_clear()
+                    return func()
+                return clear_and_call
+
+            for query in queries:
+                cases = {label: functools.partial(db.run_search, 'contestants', (condition,), (add_wildcards(query),))
+                         for label, condition in like_conditions.items()}
+                cases.update({'name index lookup': lambda: db.name_index.search(query),
+                              'name index search': lambda: db.search_contestants(query, None, None, None, None)})
+                for label, func in cases.items():
+                    func = uncached(func)
+                    matches = len(func())
+                    print('{:>6}x {:<16}{:<20}{:>10.1f} us {:>7} matches'.format(
+                        factor, query, label, 1e6 / requests_per_second(func, args.duration), matches))
+            db.pool.close_all()
+
+
+def run_searches(backend) -> list:
+    """
+    Runs every benchmark search against a backend
+    :param backend: object providing search_contestants, search_episodes and search_seasons
+    :return: list of results, in the order of benchmark_searches
+    """
+    return [run_search(backend, table, params) for table, searches in benchmark_searches.items()
+            for params in searches]
+
+
+def bench_backends(args: argparse.Namespace):
+    """
+    Checks that the columnar backend returns the same rows as SQLite for every benchmark search, then compares the
+    latency of both backends
+    :param args: command line arguments
+    """
+    from columnar import ColumnarBackend
+    from database import Database
+    db = Database()
+    backends = {'sqlite': db, 'columnar': ColumnarBackend(db)}
+    expected = run_searches(db)
+    actual = run_searches(backends['columnar'])
+    searches = [(table, params) for table, table_searches in benchmark_searches.items() for params in table_searches]
+    mismatches = [search for search, want, got in zip(searches, expected, actual) if want != got]
+    for table in benchmark_searches:
+        if db.select_all(table) != backends['columnar'].select_all(table):
+            mismatches.append('select_all ' + table)
+    if mismatches:
+        raise SystemExit('Backends disagree on: {}'.format(mismatches))
+    print('{} searches return identical rows'.format(len(searches)))
+    for label, backend in backends.items():
+        rate = requests_per_second(lambda: run_searches(backend), args.duration)
+        print('{:<22}{:>10.1f} us/search'.format(label, 1e6 / (rate * len(searches))))
+
+
+def scale_frames(contestant_df, episode_df, factor: int) -> tuple:
+    """
+    Makes a larger dataset by repeating the real seasons `factor` times, with renamed contestants and renumbered
+    seasons in each copy
+    :param contestant_df: contestants DataFrame
+    :param episode_df: episodes DataFrame
+    :param factor: number of copies
+    :return: tuple of scaled contestants and episodes DataFrames
+    """
+    import pandas as pd
+    num_seasons = int(contestant_df['season'].max())
+    contestant_copies, episode_copies = [], []
+    for copy in range(factor):
+        contestants = contestant_df.copy()
+        episodes = episode_df.copy()
+        if copy:
+            contestants['name'] = contestants['name'] + ' ' + str(copy)
+            has_winner = episodes['winner'].notna()
+            episodes.loc[has_winner, 'winner'] = episodes.loc[has_winner, 'winner'] + ' ' + str(copy)
+        contestants['season'] += copy * num_seasons
+        episodes['season'] += copy * num_seasons
+        contestant_copies.append(contestants)
+        episode_copies.append(episodes)
+    return pd.concat(contestant_copies, ignore_index=True), pd.concat(episode_copies, ignore_index=True)
+
+
+def bench_build(args: argparse.Namespace):
+    """
+    Times create_database on the real data and on scaled-up copies of it
+    :param args: command line arguments
+    """
+    from database import Database
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for factor in args.scales:
+            db = Database(os.path.join(tmp_dir, 'build_{}.db'.format(factor)))
+            db.contestant_df, db.episode_df = scale_frames(db.contestant_df, db.episode_df, factor)
+            start = time.perf_counter()
+            db.create_database()
+            elapsed = time.perf_counter() - start
+            num_rows = len(db.contestant_df) + len(db.episode_df)
+            print('{:>6}x {:>9} rows {:>9.3f} s {:>12.0f} rows/s'.format(factor, num_rows, elapsed, num_rows / elapsed))
+            db.pool.close_all()
+
+
+def bench_sync(args: argparse.Namespace):
+    """
+    Times adding one season to a scaled-up database with sync_database against rebuilding it with create_database,
+    and extending the name index for the new names, which servers do on their first search after the sync, against
+    building it from scratch
+    :param args: command line arguments
+    """
+    from name_index import NameIndex
+    from database import Database
+    factor = max(args.scales)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = Database(os.path.join(tmp_dir, 'sync.db'))
+        contestant_df, episode_df = scale_frames(db.contestant_df, db.episode_df, factor)
+        last_season = contestant_df['season'].max()
+        db.contestant_df = contestant_df[contestant_df['season'] < last_season]
+        db.episode_df = episode_df[episode_df['season'] < last_season]
+        db.create_database()
+        # build the index the sync will extend, as a server would have
+        db.name_index
+        db.contestant_df, db.episode_df = contestant_df, episode_df
+        start = time.perf_counter()
+        changes = db.sync_database()
+        print('{:<22}{:>10.3f} s {}'.format('sync one season', time.perf_counter() - start, changes))
+        start = time.perf_counter()
+        # the first use after the sync extends the index
+        db.name_index
+        print('{:<22}{:>10.3f} s'.format('name index update', time.perf_counter() - start))
+        start = time.perf_counter()
+        db.create_database()
+        print('{:<22}{:>10.3f} s'.format('full rebuild', time.perf_counter() - start))
+        start = time.perf_counter()
+        NameIndex(db.pool.connection().execute('SELECT id, name FROM Contestants ORDER BY id'))
+        print('{:<22}{:>10.3f} s'.format('name index build', time.perf_counter() - start))
+        db.pool.close_all()
+
+
+def bench_snapshot(args: argparse.Namespace):
+    """
+    Compares concurrent readers of the database file against readers of an immutable snapshot of it, on a database of
+    the largest --scales size. Every query checks the data version first, like a request does.
+    :param args: command line arguments
+    """
+    from database import Database, season_conditions
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'snapshot.db')
+        builder = Database(path, snapshots=True)
+        builder.contestant_df, builder.episode_df = scale_frames(builder.contestant_df, builder.episode_df,
+                                                                 max(args.scales))
+        builder.create_database()
+        num_seasons = int(builder.contestant_df['season'].max())
+        for label, db in (('database file', Database(path)), ('immutable snapshot', Database(path, snapshots=True))):
+            counts = [0] * args.concurrency
+            end = time.perf_counter() + args.duration
+
+            def reader(i: int):
+                season = i
+                while time.perf_counter() < end:
+                    db.data_version()
+                    list(db.iter_rows('contestants', (season_conditions['contestants'],),
+                                      (season % num_seasons + 1,)))
+                    season += 1
+                    counts[i] += 1
+
+            threads = [threading.Thread(target=reader, args=(i,)) for i in range(args.concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            print('{:<20}{:>4} threads {:>10.1f} queries/s'.format(label, args.concurrency,
+                                                                  sum(counts) / args.duration))
+            db.pool.close_all()
+        builder.pool.close_all()
+
+
+def bench_scrape(args: argparse.Namespace):
+    """
+    Times parsing every cached season page with each available HTML parser. Runs offline from the page cache, so
+    run scraper.py once with network access first (or copy saved pages into the cache).
+    :param args: command line arguments
+    """
+    import importlib.util
+    import scraper
+    franchise = scraper.Franchise("RuPaul's Drag Race", 13,
+                                  'https://en.wikipedia.org/wiki/RuPaul%27s_Drag_Race_(season_{})')
+    page_cache = scraper.PageCache(args.cache_dir, offline=True)
+    urls = franchise.season_urls()
+    start = time.perf_counter()
+    try:
+        pages = page_cache.fetch_all(urls)
+    except FileNotFoundError as error:
+        raise SystemExit(error)
+    print('{:<22}{:>10.3f} s for {} pages'.format('read from cache', time.perf_counter() - start, len(pages)))
+    parsers = ['html.parser'] + (['lxml'] if importlib.util.find_spec('lxml') else [])
+    for parser in parsers:
+        scraper.html_parser = parser
+        start = time.perf_counter()
+        for i, (url, html) in enumerate(zip(urls, pages), 1):
+            scraper.Season(url, i, html)
+        print('{:<22}{:>10.3f} s'.format('parse with ' + parser, time.perf_counter() - start))
+
+
+startup_script = '''
+import json, resource, sys, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+print(json.dumps({'seconds': elapsed, 'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  'heavy_modules': [m for m in ('pandas', 'numpy', 'requests', 'bs4') if m in sys.modules]}))
+'''
+
+
+def bench_startup(args: argparse.Namespace):
+    """
+    Measures what a fresh serving worker costs: the time to import app.py and the peak RSS afterwards, averaged over
+    several new processes
+    :param args: command line arguments
+    """
+    runs = [json.loads(subprocess.run([sys.executable, '-c', startup_script], capture_output=True, check=True,
+                                      text=True).stdout) for _ in range(5)]
+    print('import app: {:.1f} ms, max RSS {:.1f} MB, heavy modules loaded: {}'.format(
+        1000 * statistics.mean(run['seconds'] for run in runs),
+        statistics.mean(run['max_rss_kb'] for run in runs) / 1024, runs[0]['heavy_modules'] or 'none'))
+
+
+load_paths = ['/search/contestants?season=4', '/search/contestants?name=mon', '/search/contestants?outcome=winner',
+              '/search/episodes?after=2014-04-07&before=2015-03-02', '/all/episodes']
+
+
+def bench_load(args: argparse.Namespace):
+    """
+    Load test against a running server. Start the server in the mode to measure first, e.g. `python app.py` (sync)
+    or `uvicorn asgi:app --port 5000` (async), then point --url at it.
+    :param args: command line arguments
+    """
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    end = time.perf_counter() + args.duration
+
+    def client(offset: int):
+        i = offset
+        while time.perf_counter() < end:
+            url = args.url.rstrip('/') + load_paths[i % len(load_paths)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url) as response:
+                    response.read()
+            except OSError as error:
+                with lock:
+                    errors.append(error)
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if not latencies:
+        raise SystemExit('No successful requests; is the server running at {}?'.format(args.url))
+    percentiles = statistics.quantiles(latencies, n=100)
+    print('{} clients: {:.1f} req/s, p50 {:.2f} ms, p99 {:.2f} ms, {} errors'.format(
+        args.concurrency, len(latencies) / args.duration, percentiles[49] * 1000, percentiles[98] * 1000,
+        len(errors)))
+
+
+def time_calls(func: Callable, repeats: int) -> dict:
+    """
+    Calls `func` a fixed number of times, for timings that can be compared between runs
+    :param func: function to call, taking no arguments
+    :param repeats: number of calls
+    :return: dictionary with the median and fastest call in milliseconds, and the size of the last result
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    size = len(result) if result is not None and hasattr(result, '__len__') else None
+    return {'median_ms': 1000 * statistics.median(times), 'min_ms': 1000 * min(times), 'size': size}
+
+
+def suite_values(db) -> dict:
+    """
+    Picks a value for each search parameter that matches some, but not all, of the synthetic data
+    :param db: Database built from synthetic data
+    :return: dictionary mapping each table to a dictionary of search parameter values
+    """
+    num_seasons = len(db.select_all('seasons'))
+    season = str(num_seasons // 2 + 1)
+    winner = db.search_seasons(season, None)[0][0]
+    return {'contestants': {'name': winner.split()[-1][:4], 'outcome': 'winner', 'season': season,
+                            'min_age': '25', 'max_age': '32'},
+            'episodes': {'season': season, 'after': '2014-01-01', 'before': '2016-01-01', 'from_date': '2015-01-01',
+                         'to_date': '2015-12-31'},
+            'seasons': {'season': season, 'winner': winner}}
+
+
+def bench_suite(args: argparse.Namespace):
+    """
+    Runs the database and API benchmarks on synthetic data of each --scales size and writes the timings to --report
+    as JSON, so runs on different commits can be compared. At each scale it times generating the CSV files,
+    create_database, select_all of each table, generic_search with every combination of each table's parameters, and
+    the Flask routes through the test client, with and without their caches. Searches run with the caches cleared.
+    :param args: command line arguments
+    """
+    import itertools
+    import platform
+    import sqlite3
+    import app
+    import synthetic
+    from caching import ResponseCache
+    from database import Database
+    results = []
+
+    def record(scale: int, group: str, case: str, timing: dict):
+        results.append(dict(scale=scale, group=group, case=case, **timing))
+        print('{:>6}x {:<12}{:<60}{:>10.2f} ms'.format(scale, group, case, timing['median_ms']))
+
+    def uncached(func: Callable) -> Callable:
+        def clear_and_call():
+            db.search_cache.clear()
+            db.name_index.search.cache_clear()
+            shard.responses.clear()
+            return func()
+        return clear_and_call
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for scale in args.scales:
+            data_dir = os.path.join(tmp_dir, 'data_{}'.format(scale))
+            counts = {}
+            timing = time_calls(lambda: counts.update(synthetic.generate(data_dir, scale, args.seed)), 1)
+            record(scale, 'generate', 'csv files', dict(timing, size=sum(counts.values())))
+            db = Database(os.path.join(tmp_dir, 'suite_{}.db'.format(scale)), data_dir=data_dir)
+            record(scale, 'build', 'create_database', time_calls(db.create_database, 1))
+            backend = app.get_backend(app.app.config['DATABASE_BACKEND'], db)
+            funcs = {table: getattr(backend, 'search_' + table) for table in app.search_funcs}
+            shard = app.Shard(db, backend, funcs, ResponseCache(db.data_version))
+            # served like a franchise, under /benchmark/...
+            app.shards['benchmark'] = shard
+            for table in app.search_funcs:
+                record(scale, 'select_all', table, time_calls(uncached(lambda: backend.select_all(table)),
+                                                              args.repeats))
+            values = suite_values(db)
+            for table, params in app.search_params.items():
+                for num_params in range(1, len(params) + 1):
+                    for combination in itertools.combinations(params, num_params):
+                        search_args = [values[table][param] if param in combination else None for param in params]
+                        record(scale, 'search', '{} {}'.format(table, ','.join(combination)),
+                               time_calls(uncached(lambda: funcs[table](*search_args)), args.repeats))
+            client = app.app.test_client()
+            paths = ['/benchmark/all/' + table for table in app.search_funcs]
+            paths += ['/benchmark/stats/' + name for name in app.stats_queries]
+            paths += ['/benchmark/search/{}?{}'.format(table, urllib.parse.urlencode({param: value}))
+                      for table in app.search_funcs for param, value in values[table].items()]
+            paths.append('/benchmark/autocomplete?' + urllib.parse.urlencode({'name': values['contestants']['name']}))
+
+            def get(path: str) -> bytes:
+                response = client.get(path)
+                if response.status_code != 200:
+                    raise SystemExit('{} returned {}'.format(path, response.status_code))
+                return response.get_data()
+
+            for path in paths:
+                record(scale, 'route', path, time_calls(uncached(lambda: get(path)), args.repeats))
+                record(scale, 'route', path + ' (cached)', time_calls(lambda: get(path), args.repeats))
+            del app.shards['benchmark']
+            db.pool.close_all()
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, check=True,
+                                text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    report = {'commit': commit, 'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'python': platform.python_version(),
+              'sqlite': sqlite3.sqlite_version, 'platform': platform.platform(),
+              'backend': app.app.config['DATABASE_BACKEND'], 'seed': args.seed, 'repeats': args.repeats,
+              'scales': args.scales, 'results': results}
+    with open(args.report, 'w') as fh:
+        json.dump(report, fh, indent=2)
+    print('Wrote {} results to {}'.format(len(results), args.report))
+
+
+benchmarks = {'search': bench_search, 'backends': bench_backends, 'build': bench_build, 'load': bench_load,
+              'batch': bench_batch, 'scrape': bench_scrape, 'sync': bench_sync,
+              'startup': bench_startup, 'compile': bench_compile,
+              'encode': bench_encode, 'names': bench_names, 'snapshot': bench_snapshot, 'suite': bench_suite}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('benchmark', choices=sorted(benchmarks))
+    parser.add_argument('--duration', type=float, default=3.0, help='seconds to run each case for')
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 100],
+                        help='dataset sizes, as multiples of the real data')
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='server to load test')
+    parser.add_argument('--concurrency', type=int, default=32, help='number of concurrent load test clients')
+    parser.add_argument('--repeats', type=int, default=5, help='calls to time each suite case with')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic data of the suite')
+    parser.add_argument('--report', default='benchmark-report.json', help='file to write the suite results to')
+    parser.add_argument('--cache-dir', default='data/html_cache', help='page cache to run the scrape benchmark from')
+    cli_args = parser.parse_args()
+    benchmarks[cli_args.benchmark](cli_args)
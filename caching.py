@@ -0,0 +1,115 @@
+"""Caches that let app.py skip the database and JSON encoding for repeated requests"""
+import hashlib
+import threading
+import time
+from collections import namedtuple, OrderedDict
+from typing import Callable, Hashable
+
+CachedResponse = namedtuple('CachedResponse', ['body', 'etag', 'version'])
+
+
+class ResponseCache:
+    def __init__(self, version_func: Callable[[], Hashable]):
+        """
+        Keeps fully encoded response bodies, rebuilding one only when the data version it was built from changes
+        :param version_func: function returning the current data version, e.g. Database.data_version
+        """
+        self.version_func = version_func
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, build: Callable[[], bytes]) -> CachedResponse:
+        """
+        Gets the cached response for `key`, building it first if it is missing or stale
+        :param key: cache key, e.g. the table name
+        :param build: function returning the encoded response body
+        :return: CachedResponse with the body and its strong ETag
+        """
+        version = self.version_func()
+        entry = self._entries.get(key)
+        if entry is None or entry.version != version:
+            self.misses += 1
+            body = build()
+            entry = CachedResponse(body=body, etag=hashlib.sha1(body).hexdigest(), version=version)
+            with self._lock:
+                self._entries[key] = entry
+        else:
+            self.hits += 1
+        return entry
+
+    def clear(self):
+        """
+        Drops every cached response
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Gets the cache counters
+        :return: dictionary with hits, misses and current size
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+class LRUCache:
+    def __init__(self, maxsize: int = 256, ttl: float = 300.0):
+        """
+        Bounded least-recently-used cache whose entries also expire after a fixed time
+        :param maxsize: maximum number of entries kept
+        :param ttl: seconds an entry stays valid
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default=None):
+        """
+        Gets the value cached for `key` and marks it as recently used
+        :param key: cache key
+        :param default: value to return on a miss
+        :return: cached value or `default`
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value):
+        """
+        Caches `value` under `key`, evicting the least recently used entry if the cache is full
+        :param key: cache key
+        :param value: value to cache
+        """
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Drops every entry. The hit, miss and eviction counters are kept.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Gets the cache counters
+        :return: dictionary with hits, misses, evictions and current size
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'size': len(self._entries)}
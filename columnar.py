@@ -0,0 +1,305 @@
+"""In-memory columnar query backend. Answers the same searches as database.Database with vectorized pandas/NumPy
+filters instead of SQL. Used by app.py when the `columnar` backend is configured."""
+import re
+import string
+import threading
+from collections import namedtuple
+from typing import List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from input_validators import (validate_sqlite_integer, process_single_outcome, parse_outcome_list, single_value,
+                              parse_integer_list, parse_integer_range, date_key)
+from headers import result_headers
+from name_index import rank_rows
+
+ColumnFilter = namedtuple('ColumnFilter', ['searched_val', 'mask', 'validator'])
+
+# SQLite's LIKE only folds the case of ASCII letters
+ascii_lower = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def like_to_regex(pattern: str) -> re.Pattern:
+    """
+    Translates a SQL LIKE pattern into a compiled regular expression with SQLite's matching rules: `%` matches any run
+    of characters, `_` matches one character, and only ASCII letters are compared case-insensitively
+    :param pattern: LIKE pattern
+    :return: compiled regular expression that must match the whole value
+    """
+    parts = []
+    for char in pattern:
+        if char == '%':
+            parts.append('.*')
+        elif char == '_':
+            parts.append('.')
+        else:
+            parts.append(re.escape(char))
+    return re.compile(''.join(parts), re.IGNORECASE | re.ASCII | re.DOTALL)
+
+
+def numeric_affinity(value: str) -> Union[int, float, None]:
+    """
+    Converts a search value the way SQLite does when it is compared to an INTEGER column
+    :param value: user-provided value
+    :return: int or float if the value is a numeric literal, None if it can never equal a number
+    """
+    if '_' in value:
+        return None
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            continue
+    return None
+
+
+class ColumnarTables:
+    def __init__(self, database):
+        """
+        Pre-joins the tables once, using the SQLite backend's own SELECT so rows and row order match it exactly. The
+        copy is never updated; ColumnarBackend replaces it when the data changes.
+        :param database: database.Database to load the rows from
+        """
+        self.rows = {table: database.select_all(table) for table in ('contestants', 'episodes', 'seasons')}
+        # names are matched with the database's name index, loaded from the same file as the rows
+        self.name_index = database.name_index
+        self.frames = {table: pd.DataFrame(rows, columns=result_headers[table].split(','))
+                       for table, rows in self.rows.items()}
+        contestants = self.frames['contestants']
+        episodes = self.frames['episodes']
+        self.contestant_names = contestants['name'].to_numpy(dtype=str)
+        self.contestant_outcomes = self.lowered(contestants['outcome'])
+        self.contestant_ages = contestants['age'].to_numpy(dtype=np.int64)
+        self.contestant_seasons = contestants['season'].to_numpy(dtype=np.int64)
+        self.episode_seasons = episodes['season'].to_numpy(dtype=np.int64)
+        # integer dates, like Episodes.date_key
+        self.episode_date_keys = np.array([date_key(date) for date in episodes['date']], dtype=np.int64)
+        seasons = self.frames['seasons']
+        # seasons without a winner yet never match a winner search, like NULL in SQL
+        self.season_has_winner = seasons['winner'].notna().to_numpy()
+        self.season_winners = seasons['winner'].fillna('').to_numpy(dtype=str)
+        self.season_numbers = seasons['season'].to_numpy(dtype=np.int64)
+
+    def select_all(self, table: str) -> List[Tuple]:
+        """
+        Gets all items from a specified table
+        :param: table to get all items from
+        :return: List with tuple for each item
+        """
+        if table not in self.rows:
+            raise KeyError("No such table")
+        return list(self.rows[table])
+
+    def search_contestants(self, name: Union[str, None], outcome: Union[str, None], season: Union[str, None],
+                           min_age: Union[str, None], max_age: Union[str, None]):
+        """
+        Searches for contestants matching specific criteria. See database.Database.search_contestants.
+        :return: List of Tuples, where each Tuple contains the data for one contestant or None if there were no valid
+        search parameters
+        """
+        name_filter = ColumnFilter(searched_val=name, validator=None,
+                                   mask=lambda val: np.isin(self.contestant_names, self.name_index.search(val)))
+        # outcomes of tied contestants look like 10th/11th, so match either side of the slash
+        outcome_filter = ColumnFilter(searched_val=outcome, validator=process_single_outcome,
+                                      mask=self.outcome_mask)
+        outcome_list_filter = ColumnFilter(searched_val=outcome, validator=parse_outcome_list,
+                                           mask=lambda val: np.logical_or.reduce([self.outcome_mask(one_outcome)
+                                                                                  for one_outcome in val]))
+        min_age_filter = ColumnFilter(searched_val=min_age, validator=validate_sqlite_integer,
+                                      mask=lambda val: self.contestant_ages >= val)
+        max_age_filter = ColumnFilter(searched_val=max_age, validator=validate_sqlite_integer,
+                                      mask=lambda val: self.contestant_ages <= val)
+        rows = self.generic_search('contestants', name_filter, outcome_filter, outcome_list_filter, min_age_filter,
+                                   max_age_filter, *self.season_filters(self.contestant_seasons, season))
+        return rank_rows(rows, self.name_index.search(name), 0) if rows and name else rows
+
+    def search_episodes(self, season: Union[str, None], after: Union[str, None], before: Union[str, None],
+                        from_date: Union[str, None], to_date: Union[str, None]):
+        """
+        Searches episodes matching search criteria. See database.Database.search_episodes.
+        :return: List of Tuples, where each Tuple contains the data for one episode or None if there were no valid
+        search parameters
+        """
+        date_filters = [ColumnFilter(searched_val=after, validator=date_key,
+                                     mask=lambda val: self.episode_date_keys > val),
+                        ColumnFilter(searched_val=before, validator=date_key,
+                                     mask=lambda val: self.episode_date_keys < val),
+                        ColumnFilter(searched_val=from_date, validator=date_key,
+                                     mask=lambda val: self.episode_date_keys >= val),
+                        ColumnFilter(searched_val=to_date, validator=date_key,
+                                     mask=lambda val: self.episode_date_keys <= val)]
+        return self.generic_search('episodes', *self.season_filters(self.episode_seasons, season), *date_filters)
+
+    def search_seasons(self, season: Union[str, None], winner: Union[str, None]):
+        """
+        Searches seasons matching search criteria. See database.Database.search_seasons.
+        :return: List of Tuples, where each Tuple contains the data for one season or None if there were no valid
+        search parameters
+        """
+        winner_filter = ColumnFilter(searched_val=winner, validator=None,
+                                     mask=lambda val: (np.isin(self.season_winners, self.name_index.search(val)) &
+                                                       self.season_has_winner))
+        rows = self.generic_search('seasons', *self.season_filters(self.season_numbers, season), winner_filter)
+        return rank_rows(rows, self.name_index.search(winner), 0) if rows and winner else rows
+
+    def season_filters(self, column: np.ndarray, season: Union[str, None]) -> Tuple[ColumnFilter, ...]:
+        """
+        Filters for the forms of the season parameter: a single season, a list such as 3,5,9, or a range such as 4-8.
+        See database.Database.season_search_params.
+        :param column: array of season numbers
+        :param season: user-provided value
+        :return: tuple of ColumnFilter named tuples
+        """
+        return (ColumnFilter(searched_val=season, validator=single_value, mask=lambda val: self.equals(column, val)),
+                ColumnFilter(searched_val=season, validator=parse_integer_list, mask=lambda val: np.isin(column, val)),
+                ColumnFilter(searched_val=season, validator=parse_integer_range,
+                             mask=lambda val: (column >= val[0]) & (column <= val[1])))
+
+    def outcome_mask(self, outcome: str) -> np.ndarray:
+        """
+        Matches one processed outcome. Outcomes of tied contestants look like 10th/11th, so either side of the slash
+        matches.
+        :param outcome: processed outcome
+        :return: boolean mask
+        """
+        return self.like(self.contestant_outcomes, outcome + '%') | self.like(self.contestant_outcomes, '%/' + outcome)
+
+    def batch_search(self, table: str, arg_lists: List[list]) -> list:
+        """
+        Runs many searches on one table. See database.Database.batch_search.
+        :param table: contestants, episodes or seasons
+        :param arg_lists: list of positional arguments for search_contestants, search_episodes or search_seasons
+        :return: list with the result of each search, in the same order
+        """
+        search_func = {'contestants': self.search_contestants, 'episodes': self.search_episodes,
+                       'seasons': self.search_seasons}[table]
+        return [search_func(*args) for args in arg_lists]
+
+    def generic_search(self, table: str, *args: ColumnFilter):
+        """
+        Does input validation & processing, combines the filter masks, and returns the matching rows
+        :param table: contestants, episodes or seasons
+        :param args: a ColumnFilter named tuple for each search parameter
+        :return: list of tuples containing search results or None if there were no valid search parameters
+        """
+        combined = None
+        for arg in args:
+            if not arg.searched_val:
+                continue
+            processed_val = arg.searched_val
+            if arg.validator:
+                processed_val = arg.validator(arg.searched_val)
+                if not processed_val:
+                    continue
+            mask = arg.mask(processed_val)
+            combined = mask if combined is None else combined & mask
+        if combined is None:
+            return None
+        rows = self.rows[table]
+        return [rows[i] for i in np.flatnonzero(combined)]
+
+    @staticmethod
+    def lowered(column: pd.Series) -> np.ndarray:
+        """
+        Converts a text column to a NumPy string array with ASCII letters lowercased, for use with `like`
+        :param column: text column
+        :return: array of strings
+        """
+        return np.array([value.translate(ascii_lower) for value in column], dtype=str)
+
+    @staticmethod
+    def like(column: np.ndarray, pattern: str) -> np.ndarray:
+        """
+        Vectorized SQL LIKE. Prefix, suffix and substring patterns use NumPy string functions; anything else falls
+        back to a regular expression per value.
+        :param column: array of strings prepared with `lowered`
+        :param pattern: LIKE pattern
+        :return: boolean mask
+        """
+        pattern = pattern.translate(ascii_lower)
+        starts_open = pattern.startswith('%')
+        ends_open = len(pattern) > 1 and pattern.endswith('%')
+        literal = pattern[int(starts_open):len(pattern) - int(ends_open)]
+        if '%' in literal or '_' in literal:
+            matcher = like_to_regex(pattern).fullmatch
+            return np.fromiter((matcher(value) is not None for value in column), dtype=bool, count=len(column))
+        if starts_open and ends_open:
+            return np.char.find(column, literal) >= 0
+        if starts_open:
+            return np.char.endswith(column, literal)
+        if ends_open:
+            return np.char.startswith(column, literal)
+        return column == literal
+
+    @staticmethod
+    def equals(column: np.ndarray, value: str) -> np.ndarray:
+        """
+        Compares an integer column to a raw search value
+        :param column: array of integers
+        :param value: user-provided value
+        :return: boolean mask
+        """
+        number = numeric_affinity(value)
+        if number is None:
+            return np.zeros(len(column), dtype=bool)
+        return column == number
+
+
+class ColumnarBackend:
+    def __init__(self, database):
+        """
+        Answers searches from a ColumnarTables copy of the database, which is reloaded whenever the database's data
+        version changes, e.g. after sync_database, create_database or a new snapshot. Each call reads a single copy,
+        so a search never mixes old and new data.
+        :param database: database.Database to load the rows from
+        """
+        self.database = database
+        self._lock = threading.Lock()
+        self.loaded_data_version = database.data_version()
+        self.tables = ColumnarTables(database)
+
+    def current(self) -> ColumnarTables:
+        """
+        Gets the copy of the current data, reloading it first if the data version has changed since it was loaded
+        :return: ColumnarTables
+        """
+        version = self.database.data_version()
+        if version != self.loaded_data_version:
+            with self._lock:
+                if version != self.loaded_data_version:
+                    self.tables = ColumnarTables(self.database)
+                    self.loaded_data_version = version
+        return self.tables
+
+    def select_all(self, table: str) -> List[Tuple]:
+        """
+        Gets all items from a specified table. See ColumnarTables.select_all.
+        """
+        return self.current().select_all(table)
+
+    def search_contestants(self, name: Union[str, None], outcome: Union[str, None], season: Union[str, None],
+                           min_age: Union[str, None], max_age: Union[str, None]):
+        """
+        Searches for contestants matching specific criteria. See database.Database.search_contestants.
+        """
+        return self.current().search_contestants(name, outcome, season, min_age, max_age)
+
+    def search_episodes(self, season: Union[str, None], after: Union[str, None], before: Union[str, None],
+                        from_date: Union[str, None], to_date: Union[str, None]):
+        """
+        Searches episodes matching search criteria. See database.Database.search_episodes.
+        """
+        return self.current().search_episodes(season, after, before, from_date, to_date)
+
+    def search_seasons(self, season: Union[str, None], winner: Union[str, None]):
+        """
+        Searches seasons matching search criteria. See database.Database.search_seasons.
+        """
+        return self.current().search_seasons(season, winner)
+
+    def batch_search(self, table: str, arg_lists: List[list]) -> list:
+        """
+        Runs many searches on one table. See database.Database.batch_search.
+        """
+        return self.current().batch_search(table, arg_lists)
@@ -1,77 +1,497 @@
-import pandas as pd
+import functools
+import json
+import logging
+import math
+import os
 import sqlite3
-from typing import List, Tuple, Union
-from input_validators import validate_integer_input, is_valid_date, process_outcome_search, add_wildcards
+import threading
+import time
+import weakref
+from typing import Iterator, List, Tuple, Union
+from urllib.parse import quote
+import metrics
+from caching import LRUCache
+from summaries import create_summary_tables, drop_summary_tables, stats_queries
+from input_validators import (validate_sqlite_integer, process_single_outcome, parse_outcome_list, single_value,
+                              parse_integer_list, parse_integer_range, date_key)
+from name_index import NameIndex, rank_rows
 from collections import namedtuple
 
 
-SearchParamInfo = namedtuple('SearchParamInfo', ['searched_val', 'condition', 'validator'])
+# `position` is the index of the parameter in the arguments of the search function
+SearchParam = namedtuple('SearchParam', ['position', 'condition', 'validator', 'bind'])
+CompiledSearch = namedtuple('CompiledSearch', ['conditions', 'sql'])
+
+logger = logging.getLogger(__name__)
+
+# secondary indexes, created after the tables are loaded
+indexes = {'idx_contestants_season': 'Contestants (season)',
+           'idx_contestants_age': 'Contestants (age)',
+           'idx_contestants_outcome': 'Contestants (outcome_id)',
+           'idx_episodes_date_key': 'Episodes (date_key)',
+           'idx_episodes_winner': 'Episodes (winner_id)'}
+# columns added to tables after the first databases were built; a file without them has to be rebuilt
+required_columns = {'Episodes': ('date_key',)}
+# natural keys of the rows, used by sync_database to match CSV rows to table rows
+unique_indexes = {'idx_contestants_name_season': 'Contestants (name, season)',
+                  'idx_episodes_season_number': 'Episodes (season, number)'}
+season_conditions = {'contestants': 'Contestants.season=?', 'episodes': 'Episodes.season=?',
+                     'seasons': 'Seasons.number=?'}
+# season=3,5,9 is bound to a JSON array of the seasons, season=4-8 to its first and last season; both are looked up in
+# the season index
+season_list_conditions = {table: condition.replace('=?', ' IN (SELECT value FROM json_each(?))')
+                          for table, condition in season_conditions.items()}
+season_range_conditions = {table: condition.replace('=?', ' BETWEEN ? AND ?')
+                           for table, condition in season_conditions.items()}
+# outcome=Winner,Runner-Up is bound to a JSON array of the outcomes. The matching Outcomes rows are found once, then
+# their contestants, through the outcome index if they are a small share of the table.
+outcome_list_condition = '''Contestants.outcome_id IN (SELECT Outcomes.id FROM Outcomes JOIN json_each(?)
+                         WHERE Outcomes.outcome LIKE json_each.value || '%'
+                         OR Outcomes.outcome LIKE '%/' || json_each.value)'''
+# condition for names matched by the NameIndex, bound to a JSON array of their contestant IDs, which SQLite looks up
+# by primary key
+name_match_condition = 'Contestants.id IN (SELECT value FROM json_each(?))'
+# position of the name argument of the searches that have one, and of the name in their result rows
+name_positions = {'contestants': (0, 0), 'seasons': (1, 0)}
+
+# PRAGMAs applied to every pooled read connection; override per Database with the `pragmas` argument
+DEFAULT_PRAGMAS = {'mmap_size': 64 * 1024 * 1024, 'cache_size': -16000, 'query_only': 1}
+# file in a snapshot directory naming the snapshot to serve; replaced atomically to switch snapshots
+current_snapshot_file = 'CURRENT'
+# snapshots kept besides the current one, for readers that haven't switched to it yet
+kept_snapshots = 2
+
+
+class ThreadConnection:
+    def __init__(self, conn: sqlite3.Connection, generation: int):
+        """
+        A thread's pooled connection, kept in the thread's local storage. The pool closes the connection when this
+        object is freed, i.e. when the thread ends, so threads started per request don't leave connections open.
+        :param conn: read-only sqlite3 connection
+        :param generation: pool generation the connection was opened in
+        """
+        self.conn = conn
+        self.generation = generation
+        self.close = None
+
+
+class ConnectionPool:
+    def __init__(self, db_name: str, pragmas: dict = None, cached_statements: int = 128, immutable: bool = False):
+        """
+        Hands out one read-only SQLite connection per thread and reuses it across calls, instead of opening and
+        closing a connection for every query. A thread's connection is closed when the thread ends.
+        :param db_name: path to the SQLite database file
+        :param pragmas: PRAGMA name to value mapping applied to each new connection
+        :param cached_statements: number of prepared statements sqlite3 keeps per connection
+        :param immutable: if True, open the file as immutable: SQLite takes no locks and never checks it for changes,
+        so it must never be written to
+        """
+        self.db_name = db_name
+        self.immutable = immutable
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.cached_statements = cached_statements
+        self.generation = 0
+        self._local = threading.local()
+        # reentrant, since a connection may be closed by a thread ending while the current thread holds the lock
+        self._lock = threading.RLock()
+        self._connections = []
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        Gets the calling thread's connection, opening a new one if the thread has none or the pool was reset
+        :return: read-only sqlite3 connection
+        """
+        held = getattr(self._local, 'held', None)
+        if held is None or held.generation != self.generation:
+            if held is not None:
+                held.close()
+            conn = self._connect()
+            held = ThreadConnection(conn, self.generation)
+            # runs when the thread's local storage is freed, or when called for a stale connection
+            held.close = weakref.finalize(held, self._discard, conn)
+            self._local.held = held
+        return held.conn
+
+    def reset(self):
+        """
+        Marks all open connections as stale, so each thread reconnects on its next query. Needed after the database
+        file is rebuilt.
+        """
+        with self._lock:
+            self.generation += 1
+
+    def switch(self, db_name: str, immutable: bool):
+        """
+        Points the pool at another database file. Each thread opens the new file on its next query; until then it
+        keeps reading the file it has open.
+        :param db_name: path to the SQLite database file
+        :param immutable: if True, open the file as immutable
+        """
+        with self._lock:
+            self.db_name = db_name
+            self.immutable = immutable
+            self.generation += 1
+
+    def close_all(self):
+        """
+        Closes every connection opened by the pool
+        """
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+            self.generation += 1
+
+    def _connect(self) -> sqlite3.Connection:
+        with self._lock:
+            uri = 'file:{}?mode=ro{}'.format(quote(self.db_name), '&immutable=1' if self.immutable else '')
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=self.cached_statements)
+        for pragma, value in self.pragmas.items():
+            conn.execute('PRAGMA {}={}'.format(pragma, value))
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def _discard(self, conn: sqlite3.Connection):
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        conn.close()
+
+
+def bind_value(value) -> tuple:
+    """
+    Binds a validated search value to the one placeholder of its condition
+    :param value: validated search value
+    :return: tuple of values to bind
+    """
+    return value,
+
+
+def bind_json(values: list) -> tuple:
+    """
+    Binds a validated list of search values to the one placeholder of a json_each condition
+    :param values: validated search values
+    :return: tuple of values to bind
+    """
+    return json.dumps(values),
+
+
+def bind_outcome(outcome: str) -> tuple:
+    """
+    Binds a validated outcome to both placeholders of the outcome condition. Outcomes of tied contestants look like
+    10th/11th, so the outcome may be on either side of the slash.
+    :param outcome: validated outcome
+    :return: tuple of values to bind
+    """
+    return outcome + '%', '%/' + outcome
+
+
+def none_if_missing(value):
+    """
+    Converts the markers pandas and the scraper use for missing CSV values to None, which SQLite stores as NULL
+    :param value: value read from a CSV file
+    :return: `value` or None
+    """
+    if value is None or value == 'None' or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return value
 
 
 class Database:
-    def __init__(self):
-        self.db_name = 'drag_race.db'
-        self.contestant_df = pd.DataFrame(pd.read_csv('data/contestants.csv'))
-        self.episode_df = pd.DataFrame(pd.read_csv('data/episodes.csv'))
+    def __init__(self, db_name: str = 'drag_race.db', pragmas: dict = None, explain: bool = False,
+                 data_dir: str = 'data', snapshots: bool = False):
+        """
+        :param db_name: path to the SQLite database file
+        :param pragmas: PRAGMAs for pooled read connections, see DEFAULT_PRAGMAS
+        :param explain: if True, log the EXPLAIN QUERY PLAN output of every search query
+        :param data_dir: directory of the CSV files the database is built from
+        :param snapshots: if True, serve the current immutable snapshot of the database instead of the file itself,
+        and publish a new snapshot after every create_database and sync_database
+        """
+        self.db_name = db_name
+        self.explain = explain
+        self.data_dir = data_dir
+        self.snapshots = snapshots
+        # e.g. drag_race-snapshots/ for drag_race.db
+        self.snapshot_dir = os.path.splitext(db_name)[0] + '-snapshots'
+        self.pool = ConnectionPool(self.db_name, pragmas)
+        # search results keyed on the validated conditions and values, so equivalent inputs share an entry
+        self.search_cache = LRUCache(maxsize=256, ttl=300)
+        # the name index is built on first use after each reload, see name_index
+        self._name_index = None
+        self._name_index_generation = None
+        self._name_index_lock = threading.Lock()
+        self.reload_generation = 0
+        self.reload()
         self.select_and_join = {'contestants': '''SELECT Contestants.name, Contestants.age, Hometowns.hometown, 
                                 Outcomes.outcome, Contestants.season FROM Contestants JOIN Hometowns JOIN Outcomes 
                                 ON (Contestants.hometown_id = Hometowns.id AND Contestants.outcome_id = Outcomes.id)''',
                                 'episodes': '''SELECT Episodes.number, Episodes.title, Episodes.date, Contestants.name, 
                                 Episodes.main_challenge, Episodes.season FROM Episodes 
-                                LEFT JOIN Contestants ON Episodes.winner_id = Contestants.id'''}
+                                LEFT JOIN Contestants ON Episodes.winner_id = Contestants.id''',
+                                # the counts come from the summary tables, looked up by their primary keys
+                                'seasons': '''SELECT Contestants.name, IFNULL(SeasonEpisodeStats.episode_count, 0),
+                                (SELECT IFNULL(SUM(SeasonAgeStats.contestant_count), 0) FROM SeasonAgeStats
+                                WHERE SeasonAgeStats.season = Seasons.number), Seasons.number FROM Seasons
+                                LEFT JOIN Contestants ON Seasons.winner_id = Contestants.id
+                                LEFT JOIN SeasonEpisodeStats ON SeasonEpisodeStats.season = Seasons.number'''}
+        self.id_columns = {'contestants': 'Contestants.id', 'episodes': 'Episodes.id', 'seasons': 'Seasons.id'}
+        # searches may be answered through an index, so keep results in the order the rows were loaded
+        self.order_by = {table: ' ORDER BY ' + column for table, column in self.id_columns.items()}
+        # same queries with the row ID as an extra first column, for keyset pagination
+        self.select_with_id = {table: query.replace('SELECT ', 'SELECT {}, '.format(self.id_columns[table]), 1)
+                               for table, query in self.select_and_join.items()}
+
+    @functools.cached_property
+    def contestant_df(self):
+        """
+        Contestant CSV data, only loaded (and pandas only imported) when building the database
+        :return: pandas DataFrame
+        """
+        import pandas as pd
+        return pd.DataFrame(pd.read_csv(os.path.join(self.data_dir, 'contestants.csv')))
+
+    @functools.cached_property
+    def episode_df(self):
+        """
+        Episode CSV data, only loaded (and pandas only imported) when building the database
+        :return: pandas DataFrame
+        """
+        import pandas as pd
+        return pd.DataFrame(pd.read_csv(os.path.join(self.data_dir, 'episodes.csv')))
+
+    @functools.cached_property
+    def season_df(self):
+        """
+        Season winner CSV data, only loaded (and pandas only imported) when building the database
+        :return: pandas DataFrame
+        """
+        import pandas as pd
+        return pd.DataFrame(pd.read_csv(os.path.join(self.data_dir, 'seasons.csv')))
+
+    def file_version(self) -> tuple:
+        """
+        Identifies the current contents of the database file without querying it. Changes whenever the file is
+        replaced or written to, including writes that are still in the WAL file. In snapshot mode, once a snapshot
+        has been published, only the file naming the current snapshot is checked, since snapshots never change.
+        :return: tuple of inode, modification time and size of the database and WAL files, or of the CURRENT file
+        """
+        if self.snapshots:
+            try:
+                stat = os.stat(os.path.join(self.snapshot_dir, current_snapshot_file))
+            except FileNotFoundError:
+                pass
+            else:
+                return (stat.st_ino, stat.st_mtime_ns, stat.st_size),
+        version = []
+        for path in (self.db_name, self.db_name + '-wal'):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                version.append(None)
+            else:
+                version.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+        return tuple(version)
 
     def create_database(self):
         """
-        Creates the Database table by creating the Hometown, Outcome, and Contestants tables in the proper order. Only needs
-        to be run the first time the database is created.
+        Builds the database from the CSV data: Hometowns and Outcomes first, then Contestants and Episodes, which
+        reference them. Existing tables are dropped and everything is loaded in a single transaction, so readers see
+        either the old data or the new data. Lookup IDs are resolved in memory and rows are inserted with executemany.
+        Bumps the data version. Use sync_database to apply small changes to an existing database instead.
+        """
+        conn = sqlite3.connect(self.db_name)
+        # WAL lets the pooled readers keep serving while the file is written to
+        conn.execute('PRAGMA journal_mode=WAL')
+        cursor = conn.cursor()
+        with conn:
+            # sqlite3 would otherwise only open the transaction at the first INSERT, after the DROP and CREATE TABLEs
+            cursor.execute('BEGIN')
+            previous_version = self.read_data_version(cursor)
+            drop_summary_tables(cursor)
+            # ContestantNames is the trigram name table of databases built before names were matched in memory
+            for table in ('ContestantNames', 'Seasons', 'Episodes', 'Contestants', 'Outcomes', 'Hometowns', 'Metadata'):
+                cursor.execute('DROP TABLE IF EXISTS {}'.format(table))
+            cursor.execute('''CREATE TABLE Metadata (
+                           key TEXT PRIMARY KEY,
+                           value)
+                           ''')
+            cursor.execute("INSERT INTO Metadata (key, value) VALUES('data_version', ?)", (previous_version + 1,))
+            hometown_ids = self.create_hometown_table(cursor)
+            outcome_ids = self.create_outcome_table(cursor)
+            winner_ids = self.create_contestant_table(cursor, hometown_ids, outcome_ids)
+            self.create_episode_table(cursor, winner_ids)
+            self.create_season_table(cursor)
+            self.create_indexes(cursor)
+            create_summary_tables(cursor)
+        conn.execute('ANALYZE')
+        # copy the new tables from the WAL into the database file itself, so the file alone holds the whole build
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        conn.close()
+        if self.snapshots:
+            self.publish_snapshot()
+        self.reload()
+
+    def reload(self):
+        """
+        Drops pooled connections and cached search results, so later queries see the current database file, or the
+        current snapshot in snapshot mode
+        """
+        self.pool.switch(*self.served_file())
+        self.search_cache.clear()
+        self.loaded_version = self.file_version()
+        self.reload_generation += 1
+        missing = self.missing_columns()
+        if missing:
+            # not raised here: the command line opens an outdated file to rebuild it
+            logger.warning('%s is missing %s; rebuild it with `python database.py`', self.db_name, ', '.join(missing))
+        self.search_params = self.describe_search_params()
+        # SQL compiled for each combination of search parameters, keyed on the table and a bit per parameter
+        self.compiled_searches = {}
+        try:
+            self.loaded_data_version = self.read_data_version(self.pool.connection().cursor())
+        except sqlite3.OperationalError:
+            self.loaded_data_version = 0
+
+    def data_version(self) -> int:
+        """
+        Gets the data version, which create_database and sync_database bump whenever the data changes. Only queries
+        the database when the file has changed since it was last read, so it is cheap enough for every request.
+        :return: data version; 0 for databases built before versioning
+        """
+        if self.file_version() != self.loaded_version:
+            self.reload()
+        return self.loaded_data_version
+
+    def served_file(self) -> Tuple[str, bool]:
+        """
+        Finds the file to serve queries from: the current snapshot in snapshot mode, unless none has been published
+        yet, otherwise the database file
+        :return: tuple of the path and whether the file is immutable
+        """
+        if self.snapshots:
+            try:
+                with open(os.path.join(self.snapshot_dir, current_snapshot_file)) as fh:
+                    name = fh.read().strip()
+            except FileNotFoundError:
+                name = None
+            if name:
+                return os.path.join(self.snapshot_dir, name), True
+        return self.db_name, False
+
+    def publish_snapshot(self) -> str:
+        """
+        Copies the database into a new snapshot file with VACUUM INTO, which writes a compact copy that needs no WAL
+        file, then makes it the current snapshot by atomically replacing the CURRENT file. Databases serving
+        snapshots switch to it on their next query, without a restart. Snapshots older than the last kept_snapshots
+        are removed.
+        :return: path of the new snapshot
         """
-        self.create_hometown_table()
-        self.create_outcome_table()
-        self.create_contestant_table()
-        self.create_episode_table()
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        conn = sqlite3.connect(self.db_name)
+        name = 'v{}-{}.db'.format(self.read_data_version(conn.cursor()), time.time_ns())
+        path = os.path.join(self.snapshot_dir, name)
+        # written under a temporary name, so a half-written snapshot is never picked up
+        conn.execute('VACUUM INTO ?', (path + '.tmp',))
+        conn.close()
+        os.replace(path + '.tmp', path)
+        pointer = os.path.join(self.snapshot_dir, current_snapshot_file)
+        with open(pointer + '.tmp', 'w') as fh:
+            fh.write(name + '\n')
+        os.replace(pointer + '.tmp', pointer)
+        old_snapshots = sorted((entry for entry in os.scandir(self.snapshot_dir)
+                                if entry.name.endswith('.db') and entry.name != name),
+                               key=lambda entry: entry.stat().st_mtime_ns, reverse=True)
+        for entry in old_snapshots[kept_snapshots:]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                # still open on a system that doesn't allow removing open files; removed after a later build
+                logger.warning('Could not remove old snapshot %s', entry.path)
+        logger.info('Published snapshot %s', path)
+        return path
+
+    @staticmethod
+    def read_data_version(cursor: sqlite3.Cursor) -> int:
+        """
+        Reads the data version from the Metadata table
+        :param cursor: cursor to read with
+        :return: data version, or 0 if the database has no Metadata table
+        """
+        if not cursor.execute("SELECT 1 FROM sqlite_master WHERE name='Metadata'").fetchone():
+            return 0
+        return cursor.execute("SELECT value FROM Metadata WHERE key='data_version'").fetchone()[0]
+
+    def missing_columns(self) -> List[str]:
+        """
+        Finds the required_columns that the tables of the database file don't have
+        :return: list of Table.column names; empty if the schema is current or the database hasn't been built yet
+        """
+        missing = []
+        for table, columns in required_columns.items():
+            try:
+                existing = {row[1] for row in self.pool.connection().execute('PRAGMA table_info({})'.format(table))}
+            except sqlite3.OperationalError:
+                return []
+            if existing:
+                missing += ['{}.{}'.format(table, column) for column in columns if column not in existing]
+        return missing
+
+    def check_schema(self):
+        """
+        Checks that the database file was built with the current schema, so an outdated file fails with a clear error
+        instead of failing the searches that use the new columns
+        :raises RuntimeError: if the file needs to be rebuilt with create_database
+        """
+        missing = self.missing_columns()
+        if missing:
+            raise RuntimeError('{} was built with an older schema and is missing {}; rebuild it with `python '
+                               'database.py`'.format(self.db_name, ', '.join(missing)))
 
-    def create_hometown_table(self):
+    def create_hometown_table(self, cursor: sqlite3.Cursor) -> dict:
         """
         Creates Hometowns table in the database. Inserts unique hometowns from the Pandas DataFrame into the database.
+        :param cursor: cursor of the build transaction
+        :return: dictionary mapping each hometown to its ID
         """
         # create hometown table
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
         cursor.execute('''CREATE TABLE IF NOT EXISTS Hometowns (
                         id INTEGER PRIMARY KEY,
                         hometown TEXT)
                         ''')
-        # insert hometowns into table
-        hometowns = self.contestant_df['hometown'].unique()
-        for hometown in hometowns:
-            cursor.execute('INSERT INTO Hometowns (hometown) VALUES(?)', (hometown,))
-        conn.commit()
+        # insert hometowns into table, numbering them in order of first appearance
+        hometown_ids = {hometown: i for i, hometown in enumerate(self.contestant_df['hometown'].unique(), 1)}
+        cursor.executemany('INSERT INTO Hometowns (id, hometown) VALUES(?, ?)',
+                           ((i, hometown) for hometown, i in hometown_ids.items()))
+        return hometown_ids
 
-    def create_outcome_table(self):
+    def create_outcome_table(self, cursor: sqlite3.Cursor) -> dict:
         """
         Creates Outcomes table in the database. Inserts the unique outcomes from the Pandas DataFrame into the table.
+        :param cursor: cursor of the build transaction
+        :return: dictionary mapping each outcome to its ID
         """
         # create outcome table
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
         cursor.execute('''CREATE TABLE IF NOT EXISTS Outcomes (
                         id INTEGER PRIMARY KEY,
                         outcome TEXT NOT NULL)
                         ''')
         # insert outcomes into table
-        outcomes = self.contestant_df['outcome'].unique()
-        for outcome in outcomes:
-            cursor.execute('INSERT INTO Outcomes (outcome) VALUES(?)', (outcome,))
-        conn.commit()
-        conn.close()
+        outcome_ids = {outcome: i for i, outcome in enumerate(self.contestant_df['outcome'].unique(), 1)}
+        cursor.executemany('INSERT INTO Outcomes (id, outcome) VALUES(?, ?)',
+                           ((i, outcome) for outcome, i in outcome_ids.items()))
+        return outcome_ids
 
-    def create_contestant_table(self):
+    def create_contestant_table(self, cursor: sqlite3.Cursor, hometown_ids: dict, outcome_ids: dict) -> dict:
         """
         Loads data from contestant CSV into database
+        :param cursor: cursor of the build transaction
+        :param hometown_ids: dictionary mapping each hometown to its ID
+        :param outcome_ids: dictionary mapping each outcome to its ID
+        :return: dictionary mapping each contestant name to the ID of its first row, used to look up episode winners
         """
         # create table
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
         cursor.execute('''CREATE TABLE IF NOT EXISTS Contestants (
                        id INTEGER PRIMARY KEY,
                        name TEXT NOT NULL,
@@ -83,45 +503,205 @@ class Database:
                        FOREIGN KEY (outcome_id) REFERENCES Outcomes (id))
                        ''')
         # insert data from CSV into table
-        for row in self.contestant_df.itertuples():
-            # find hometown ID
-            hometown_id = cursor.execute('SELECT id FROM Hometowns WHERE hometown=?', (row.hometown,)).fetchone()[0]
-            # find outcome ID
-            outcome_id = cursor.execute('SELECT id FROM Outcomes WHERE outcome=?', (row.outcome,)).fetchone()[0]
-            cursor.execute('INSERT INTO Contestants (name, age, hometown_id, outcome_id, season) VALUES(?, ?, ?, ?, ?)',
-                           (row.name, int(row.age), hometown_id, outcome_id, int(row.season))
-                           )
-        conn.commit()
-        conn.close()
+        df = self.contestant_df
+        rows = [(i, name, int(age), hometown_ids[hometown], outcome_ids[outcome], int(season))
+                for i, (name, age, hometown, outcome, season)
+                in enumerate(zip(df['name'], df['age'], df['hometown'], df['outcome'], df['season']), 1)]
+        cursor.executemany('''INSERT INTO Contestants (id, name, age, hometown_id, outcome_id, season)
+                           VALUES(?, ?, ?, ?, ?, ?)''', rows)
+        winner_ids = {}
+        for row in rows:
+            # returning contestants keep the ID of their first season, as the old lookup by name did
+            winner_ids.setdefault(row[1], row[0])
+        return winner_ids
 
-    def create_episode_table(self):
+    def create_episode_table(self, cursor: sqlite3.Cursor, winner_ids: dict):
         """
         Gets data from episodes.csv and creates Episodes table in the database
+        :param cursor: cursor of the build transaction
+        :param winner_ids: dictionary mapping each contestant name to its ID
         """
         # create table
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
         cursor.execute('''CREATE TABLE IF NOT EXISTS Episodes (
                        id INTEGER PRIMARY KEY,
                        number INTEGER NOT NULL,
                        title TEXT NOT NULL,
                        date TEXT NOT NULL,
+                       date_key INTEGER NOT NULL,
                        winner_id INTEGER,
                        main_challenge TEXT,
                        season INTEGER NOT NULL,
                        FOREIGN KEY (winner_id) REFERENCES Contestants (id))
                        ''')
-        # insert episodes into table
-        for row in self.episode_df.itertuples():
-            winner_id = cursor.execute('SELECT id FROM Contestants WHERE name=?', (row.winner,)).fetchone()
-            if winner_id:
-                winner_id = winner_id[0]
-            main_challenge = None if row.main_challenge == 'None' else row.main_challenge
-            cursor.execute('''INSERT INTO Episodes (number, title, date, winner_id, main_challenge, season) 
-                           VALUES(?, ?, ?, ?, ?, ?)''',
-                           (int(row.number), row.title, row.date, winner_id, main_challenge, int(row.season)))
-        conn.commit()
+        # insert episodes into table, with the date also as an integer for date searches
+        df = self.episode_df
+        rows = ((int(number), title, date, date_key(date), winner_ids.get(winner), none_if_missing(main_challenge),
+                 int(season))
+                for number, title, date, winner, main_challenge, season
+                in zip(df['number'], df['title'], df['date'], df['winner'], df['main_challenge'], df['season']))
+        cursor.executemany('''INSERT INTO Episodes (number, title, date, date_key, winner_id, main_challenge, season)
+                           VALUES(?, ?, ?, ?, ?, ?, ?)''', rows)
+
+    def create_season_table(self, cursor: sqlite3.Cursor):
+        """
+        Creates Seasons table in the database, with a row for every season in the contestant data
+        :param cursor: cursor of the build transaction
+        """
+        cursor.execute('''CREATE TABLE IF NOT EXISTS Seasons (
+                       id INTEGER PRIMARY KEY,
+                       number INTEGER NOT NULL UNIQUE,
+                       winner_id INTEGER,
+                       FOREIGN KEY (winner_id) REFERENCES Contestants (id))
+                       ''')
+        cursor.executemany('INSERT INTO Seasons (number, winner_id) VALUES(?, ?)', self.season_rows(cursor).items())
+
+    def season_rows(self, cursor: sqlite3.Cursor) -> dict:
+        """
+        Works out the winner of each season. seasons.csv is used where it has the season; otherwise the winner is the
+        contestant whose outcome is Winner. Winners are matched to the contestant row of that season.
+        :param cursor: cursor of the build or sync transaction, after Contestants is loaded
+        :return: dictionary mapping each season number to the ID of its winner, or None if it has no winner yet
+        """
+        df = self.contestant_df
+        seasons = df['season'].tolist()
+        winners = dict.fromkeys(sorted({int(season) for season in seasons}))
+        winners.update({int(season): name for name, outcome, season
+                        in zip(df['name'].tolist(), df['outcome'].tolist(), seasons) if outcome == 'Winner'})
+        season_df = self.season_df
+        winners.update({int(number): winner for number, winner in zip(season_df['number'].tolist(),
+                                                                      season_df['winner'].tolist())})
+        contestant_ids = {(name, season): contestant_id for contestant_id, name, season
+                          in cursor.execute('SELECT id, name, season FROM Contestants')}
+        return {number: contestant_ids.get((winner, number)) for number, winner in winners.items()}
+
+    def create_indexes(self, cursor: sqlite3.Cursor):
+        """
+        Creates the secondary indexes. Run after the tables are loaded, which is faster than updating the indexes row by
+        row.
+        :param cursor: cursor of the build transaction
+        """
+        for index_name, columns in indexes.items():
+            cursor.execute('CREATE INDEX IF NOT EXISTS {} ON {}'.format(index_name, columns))
+        for index_name, columns in unique_indexes.items():
+            cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS {} ON {}'.format(index_name, columns))
+
+    def sync_database(self, reload: bool = True) -> dict:
+        """
+        Brings an existing database up to date with the CSV data without rebuilding it. Rows are matched on their
+        natural keys (name and season for contestants, season and number for episodes), and only new, changed and
+        removed rows are written, in a single transaction. The triggers keep the summary tables up to date. Bumps the
+        data version if anything changed.
+        :param reload: whether to reload this object's connections and caches afterwards; the command line skips it,
+        since it exits after syncing, and servers reload on their own when the file changes
+        :return: dictionary with the number of upserted and deleted rows for each table
+        :raises RuntimeError: if the database has to be rebuilt with create_database instead
+        """
+        self.check_schema()
+        conn = sqlite3.connect(self.db_name)
+        cursor = conn.cursor()
+        with conn:
+            cursor.execute('BEGIN')
+            df = self.contestant_df
+            hometown_ids = self.sync_lookup_table(cursor, 'Hometowns', 'hometown', df['hometown'].unique())
+            outcome_ids = self.sync_lookup_table(cursor, 'Outcomes', 'outcome', df['outcome'].unique())
+            changes = {'contestants': self.sync_contestant_table(cursor, hometown_ids, outcome_ids),
+                       'episodes': self.sync_episode_table(cursor),
+                       'seasons': self.sync_season_table(cursor)}
+            if any(any(counts.values()) for counts in changes.values()):
+                cursor.execute("UPDATE Metadata SET value = value + 1 WHERE key='data_version'")
         conn.close()
+        if self.snapshots and any(any(counts.values()) for counts in changes.values()):
+            self.publish_snapshot()
+        if reload:
+            self.reload()
+        return changes
+
+    @staticmethod
+    def sync_lookup_table(cursor: sqlite3.Cursor, table: str, column: str, values) -> dict:
+        """
+        Adds values that are missing from the Hometowns or Outcomes table
+        :param cursor: cursor of the sync transaction
+        :param table: Hometowns or Outcomes
+        :param column: hometown or outcome
+        :param values: unique values from the CSV data
+        :return: dictionary mapping each value to its ID
+        """
+        ids = dict(cursor.execute('SELECT {}, id FROM {}'.format(column, table)))
+        new_values = [(value,) for value in values if value not in ids]
+        if new_values:
+            cursor.executemany('INSERT INTO {} ({}) VALUES(?)'.format(table, column), new_values)
+            ids = dict(cursor.execute('SELECT {}, id FROM {}'.format(column, table)))
+        return ids
+
+    def sync_contestant_table(self, cursor: sqlite3.Cursor, hometown_ids: dict, outcome_ids: dict) -> dict:
+        """
+        Upserts new and changed contestants and deletes contestants no longer in the CSV data
+        :param cursor: cursor of the sync transaction
+        :param hometown_ids: dictionary mapping each hometown to its ID
+        :param outcome_ids: dictionary mapping each outcome to its ID
+        :return: dictionary with the number of upserted and deleted rows
+        """
+        existing = {(name, season): (contestant_id, age, hometown_id, outcome_id)
+                    for contestant_id, name, season, age, hometown_id, outcome_id
+                    in cursor.execute('SELECT id, name, season, age, hometown_id, outcome_id FROM Contestants')}
+        df = self.contestant_df
+        # lists, since iterating over a pandas Series boxes every value
+        wanted = {(name, int(season)): (int(age), hometown_ids[hometown], outcome_ids[outcome])
+                  for name, age, hometown, outcome, season
+                  in zip(*(df[column].tolist() for column in ('name', 'age', 'hometown', 'outcome', 'season')))}
+        upserts = [(name, age, hometown_id, outcome_id, season)
+                   for (name, season), (age, hometown_id, outcome_id) in wanted.items()
+                   if existing.get((name, season), (None,))[1:] != (age, hometown_id, outcome_id)]
+        deletes = [(existing[key][0],) for key in existing.keys() - wanted.keys()]
+        cursor.executemany('DELETE FROM Contestants WHERE id=?', deletes)
+        cursor.executemany('''INSERT INTO Contestants (name, age, hometown_id, outcome_id, season) VALUES(?, ?, ?, ?, ?)
+                           ON CONFLICT (name, season) DO UPDATE SET age=excluded.age,
+                           hometown_id=excluded.hometown_id, outcome_id=excluded.outcome_id''', upserts)
+        return {'upserted': len(upserts), 'deleted': len(deletes)}
+
+    def sync_season_table(self, cursor: sqlite3.Cursor) -> dict:
+        """
+        Upserts new seasons and changed winners and deletes seasons no longer in the CSV data
+        :param cursor: cursor of the sync transaction, after Contestants is synced
+        :return: dictionary with the number of upserted and deleted rows
+        """
+        existing = dict(cursor.execute('SELECT number, winner_id FROM Seasons'))
+        wanted = self.season_rows(cursor)
+        upserts = [(number, winner_id) for number, winner_id in wanted.items()
+                   if number not in existing or existing[number] != winner_id]
+        deletes = [(number,) for number in existing.keys() - wanted.keys()]
+        cursor.executemany('DELETE FROM Seasons WHERE number=?', deletes)
+        cursor.executemany('''INSERT INTO Seasons (number, winner_id) VALUES(?, ?)
+                           ON CONFLICT (number) DO UPDATE SET winner_id=excluded.winner_id''', upserts)
+        return {'upserted': len(upserts), 'deleted': len(deletes)}
+
+    def sync_episode_table(self, cursor: sqlite3.Cursor) -> dict:
+        """
+        Upserts new and changed episodes and deletes episodes no longer in the CSV data
+        :param cursor: cursor of the sync transaction
+        :return: dictionary with the number of upserted and deleted rows
+        """
+        # same winner lookup as create_contestant_table: the first row with that name
+        winner_ids = dict(cursor.execute('SELECT name, MIN(id) FROM Contestants GROUP BY name'))
+        rows = cursor.execute('SELECT id, season, number, title, date, winner_id, main_challenge FROM Episodes')
+        existing = {(season, number): (episode_id, title, date, winner_id, main_challenge)
+                    for episode_id, season, number, title, date, winner_id, main_challenge in rows}
+        df = self.episode_df
+        wanted = {(int(season), int(number)): (title, date, winner_ids.get(winner), none_if_missing(main_challenge))
+                  for number, title, date, winner, main_challenge, season
+                  in zip(*(df[column].tolist() for column in ('number', 'title', 'date', 'winner', 'main_challenge',
+                                                              'season')))}
+        upserts = [(number, title, date, date_key(date), winner_id, main_challenge, season)
+                   for (season, number), (title, date, winner_id, main_challenge) in wanted.items()
+                   if existing.get((season, number), (None,))[1:] != (title, date, winner_id, main_challenge)]
+        deletes = [(existing[key][0],) for key in existing.keys() - wanted.keys()]
+        cursor.executemany('DELETE FROM Episodes WHERE id=?', deletes)
+        cursor.executemany('''INSERT INTO Episodes (number, title, date, date_key, winner_id, main_challenge, season)
+                           VALUES(?, ?, ?, ?, ?, ?, ?)
+                           ON CONFLICT (season, number) DO UPDATE SET title=excluded.title, date=excluded.date,
+                           date_key=excluded.date_key, winner_id=excluded.winner_id,
+                           main_challenge=excluded.main_challenge''', upserts)
+        return {'upserted': len(upserts), 'deleted': len(deletes)}
 
     def select_all(self, table: str) -> List[Tuple]:
         """
@@ -129,91 +709,347 @@ class Database:
         :param: table to get all items from
         :return: List with tuple for each item
         """
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        if table == 'contestants':
-            sql_query = self.select_and_join['contestants']
-        elif table == 'episodes':
-            sql_query = self.select_and_join['episodes']
-        else:
+        cursor = self.pool.connection().cursor()
+        if table not in self.select_and_join:
             raise KeyError("No such table")
+        # without ORDER BY, the join order SQLite picks (e.g. driven by the outcome index) would decide the row order
+        sql_query = self.select_and_join[table] + self.order_by[table]
         all_items = cursor.execute(sql_query).fetchall()
-        conn.close()
         return all_items
 
+    def select_stats(self, name: str) -> List[Tuple]:
+        """
+        Gets precomputed statistics from the summary tables
+        :param name: one of the keys of summaries.stats_queries, e.g. states
+        :return: List with a tuple for each row of the statistic
+        """
+        if name not in stats_queries:
+            raise KeyError("No such statistic")
+        return self.pool.connection().execute(stats_queries[name][1]).fetchall()
+
     def search_contestants(self, name: Union[str, None], outcome: Union[str, None], season: Union[str, None],
                            min_age: Union[str, None], max_age: Union[str, None]):
         """
         Searches for contestants matching specific criteria.
-        :param name: name of contestant, which may be partial
-        :param outcome: outcome to search for (e.g. 4th for 4th place)
-        :param season: season to search for; valid seasons are 1-13
+        :param name: name of contestant, which may be partial or misspelled
+        :param outcome: outcome to search for (e.g. 4th for 4th place), or a comma-separated list of outcomes
+        :param season: season to search for; valid seasons are 1-13. A list (3,5,9) or range (4-8) of seasons matches
+        any of them
         :param min_age: minimum age of contestants to search for
         :param max_age: maximum age of contestants to search for
         :return: List of Tuples, where each Tuple contains the data for one contestant or None if there were no valid
         search parameters
         """
-        name_info = SearchParamInfo(searched_val=name, condition='Contestants.name LIKE ?', validator=add_wildcards)
-        outcome_info = SearchParamInfo(searched_val=outcome,
-                                       condition='(Outcomes.outcome LIKE ? OR Outcomes.outcome LIKE ?)',
-                                       validator=process_outcome_search)
-        min_age_info = SearchParamInfo(searched_val=min_age, condition='Contestants.age >=?',
-                                       validator=validate_integer_input)
-        max_age_info = SearchParamInfo(searched_val=max_age, condition='Contestants.age <=?',
-                                       validator=process_outcome_search)
-        season_info = SearchParamInfo(searched_val=season, condition='Contestants.season=?', validator=None)
-        matching_contestants = self.generic_search('contestants', name_info, outcome_info, min_age_info, max_age_info,
-                                                   season_info)
-        return matching_contestants
-
-    def search_episodes(self, season: Union[str, None], after: Union[str, None], before: Union[str, None]):
+        return self.generic_search('contestants', (name, outcome, season, min_age, max_age))
+
+    def search_episodes(self, season: Union[str, None], after: Union[str, None], before: Union[str, None],
+                        from_date: Union[str, None], to_date: Union[str, None]):
         """
         Searches Episodes table for episodes matching search criteria
-        :param season: season to search for; valid seasons are 1-13
+        :param season: season to search for; valid seasons are 1-13. A list (3,5,9) or range (4-8) of seasons matches
+        any of them
         :param after: date to get episodes that aired after
         :param before: date to get episodes that aired before
+        :param from_date: date to get episodes that aired on or after
+        :param to_date: date to get episodes that aired on or before
         :return: List of Tuples, where each Tuple contains the data for one contestant or None if there were no valid
         search parameters
         """
-        season_info = SearchParamInfo(searched_val=season, condition='Episodes.season=?', validator=None)
-        min_date_info = SearchParamInfo(searched_val=after, condition='Episodes.date > DATE(?)', validator=is_valid_date)
-        max_date_info = SearchParamInfo(searched_val=before, condition='Episodes.date < DATE(?)', validator=is_valid_date)
-        matching_episodes = self.generic_search('episodes', season_info, min_date_info, max_date_info)
-        return matching_episodes
+        return self.generic_search('episodes', (season, after, before, from_date, to_date))
+
+    def search_seasons(self, season: Union[str, None], winner: Union[str, None]):
+        """
+        Searches Seasons table for seasons matching search criteria
+        :param season: season number to search for, or a list (3,5,9) or range (4-8) of season numbers
+        :param winner: name, part of the name, or misspelled name of the season's winner
+        :return: List of Tuples, where each Tuple contains the winner, episode count, contestant count and number of
+        one season or None if there were no valid search parameters
+        """
+        return self.generic_search('seasons', (season, winner))
+
+    def describe_search_params(self) -> dict:
+        """
+        Describes the search parameters of each table, in the order their conditions are combined
+        :return: dictionary mapping each table to a tuple of SearchParam named tuples
+        """
+        return {'contestants': (SearchParam(0, name_match_condition, self.match_names, bind_value),
+                                SearchParam(1, '(Outcomes.outcome LIKE ? OR Outcomes.outcome LIKE ?)',
+                                            process_single_outcome, bind_outcome),
+                                SearchParam(1, outcome_list_condition, parse_outcome_list, bind_json),
+                                SearchParam(3, 'Contestants.age >=?', validate_sqlite_integer, bind_value),
+                                SearchParam(4, 'Contestants.age <=?', validate_sqlite_integer, bind_value),
+                                *self.season_search_params('contestants', 2)),
+                'episodes': (*self.season_search_params('episodes', 0),
+                             SearchParam(1, 'Episodes.date_key > ?', date_key, bind_value),
+                             SearchParam(2, 'Episodes.date_key < ?', date_key, bind_value),
+                             SearchParam(3, 'Episodes.date_key >= ?', date_key, bind_value),
+                             SearchParam(4, 'Episodes.date_key <= ?', date_key, bind_value)),
+                'seasons': (*self.season_search_params('seasons', 0),
+                            SearchParam(1, name_match_condition, self.match_names, bind_value))}
+
+    @staticmethod
+    def season_search_params(table: str, position: int) -> tuple:
+        """
+        Describes the forms of the season parameter: a single season, a list such as 3,5,9, or a range such as 4-8.
+        Each form has its own condition, and a value only has one form, so exactly one of them applies.
+        :param table: database table - contestants, episodes or seasons
+        :param position: index of the season parameter in the arguments of the search function
+        :return: tuple of SearchParam named tuples
+        """
+        return (SearchParam(position, season_conditions[table], single_value, bind_value),
+                SearchParam(position, season_list_conditions[table], parse_integer_list, bind_json),
+                SearchParam(position, season_range_conditions[table], parse_integer_range, tuple))
 
-    def generic_search(self, table: str, *args: SearchParamInfo):
+    def generic_search(self, table: str, args: tuple):
         """
-        Does input validation & processing, builds the SQL query, queries the database, and returns the result
-        :param table: database table - contestants or episodes
-        :param args: a SearchParamInfo named tuple for each search parameter
+        Validates and binds the search parameters, then runs the compiled query for the parameters provided
+        :param table: database table - contestants, episodes or seasons
+        :param args: positional arguments of the search function
         :return: list of tuples containing search results or None if there were no valid search parameters
         """
-        all_conditions = []
-        all_condition_vals = []
-        for arg in args:
-            if arg.searched_val:
-                # step 1 - do input validation
-                processed_val = arg.searched_val
-                if arg.validator:
-                    processed_val = arg.validator(arg.searched_val)
-                    if not processed_val:
-                        continue
-                # step 2 - append condition and condition value
-                all_conditions.append(arg.condition)
-                # have to handle special case for outcome to include ties
-                if arg.validator == process_outcome_search:
-                    all_condition_vals.append(processed_val + '%')
-                    all_condition_vals.append('%' + '/' + processed_val)
-                else:
-                    all_condition_vals.append(processed_val)
-        # step 3 - form SQL query and execute
-        if all_conditions:
-            conditions = " AND ".join(all_conditions)
-            condition_values = tuple(all_condition_vals)
-            conn = sqlite3.connect(self.db_name)
-            cursor = conn.cursor()
-            matching = cursor.execute(self.select_and_join[table] + ' WHERE ' + conditions, condition_values).fetchall()
-            conn.close()
-        else:
-            matching = None
+        compiled, condition_values = self.bind_search(table, args)
+        if compiled is None:
+            return None
+        return self.rank_by_name(table, args, self.run_search(table, compiled.conditions, condition_values,
+                                                              compiled.sql))
+
+    @property
+    def name_index(self) -> NameIndex:
+        """
+        Index of the contestant names, which are also the names of episode and season winners. Built on first use
+        after a reload, so commands that only write the database never build it, and extended from the previous index
+        when names were only added, e.g. by a sync that adds a season.
+        :return: NameIndex; empty if the database hasn't been built
+        """
+        if self._name_index_generation != self.reload_generation:
+            with self._name_index_lock:
+                generation = self.reload_generation
+                if self._name_index_generation != generation:
+                    self._name_index = self.load_name_index(self._name_index)
+                    self._name_index_generation = generation
+        return self._name_index
+
+    def load_name_index(self, previous: NameIndex = None) -> NameIndex:
+        """
+        Indexes the contestant names
+        :param previous: index of the previously loaded data, to reuse where the names are unchanged
+        :return: NameIndex; empty if the database hasn't been built
+        """
+        try:
+            cursor = self.pool.connection().cursor()
+            return NameIndex(cursor.execute('SELECT id, name FROM Contestants ORDER BY id'), previous)
+        except sqlite3.OperationalError:
+            return NameIndex([])
+
+    def match_names(self, name: str) -> str:
+        """
+        Validates a name search by looking the name up in the name index
+        :param name: name, part of a name, or a misspelled name
+        :return: JSON array of the IDs of the matching contestants, to bind to name_match_condition; an empty array if
+        none match
+        """
+        return json.dumps(self.name_index.search_ids(name))
+
+    def rank_by_name(self, table: str, args, rows):
+        """
+        Orders the results of a search with a name parameter so the best matching names come first
+        :param table: database table - contestants, episodes or seasons
+        :param args: positional arguments of the search function
+        :param rows: search results, in ID order
+        :return: the rows, ranked by name if the search had a name
+        """
+        if not rows or table not in name_positions:
+            return rows
+        arg_position, column = name_positions[table]
+        if not args[arg_position]:
+            return rows
+        return rank_rows(rows, self.name_index.search(args[arg_position]), column)
+
+    def search_conditions(self, table: str, args: list) -> Tuple[tuple, tuple]:
+        """
+        Validates the arguments of a search_contestants, search_episodes or search_seasons call without running the
+        search
+        :param table: database table - contestants, episodes or seasons
+        :param args: positional arguments for the search function
+        :return: tuple of SQL conditions and tuple of the values to bind to them
+        """
+        compiled, condition_values = self.bind_search(table, args)
+        if compiled is None:
+            return (), ()
+        return compiled.conditions, condition_values
+
+    def bind_search(self, table: str, args) -> Tuple[Union[CompiledSearch, None], tuple]:
+        """
+        Validates the search parameters and collects the values to bind for the ones that were provided. The SQL for
+        that combination of parameters is only built the first time it is seen.
+        :param table: database table - contestants, episodes or seasons
+        :param args: positional arguments of the search function
+        :return: tuple of the compiled query, or None if there were no valid search parameters, and the values to bind
+        """
+        start = time.perf_counter()
+        present = 0
+        condition_values = []
+        for bit, param in enumerate(self.search_params[table]):
+            searched_val = args[param.position]
+            if not searched_val:
+                continue
+            if param.validator:
+                searched_val = param.validator(searched_val)
+                if not searched_val:
+                    continue
+            present |= 1 << bit
+            condition_values += param.bind(searched_val)
+        metrics.registry.observe_stage('validate', time.perf_counter() - start)
+        if not present:
+            return None, ()
+        compiled = self.compiled_searches.get((table, present))
+        if compiled is None:
+            compiled = self.compile_search(table, present)
+        return compiled, tuple(condition_values)
+
+    def compile_search(self, table: str, present: int) -> CompiledSearch:
+        """
+        Builds the SQL for one combination of search parameters and keeps it for later searches. Reusing the same SQL
+        text also lets sqlite3 reuse its prepared statement.
+        :param table: database table - contestants, episodes or seasons
+        :param present: bit mask of the parameters provided, in the order of search_params
+        :return: compiled query
+        """
+        conditions = tuple(param.condition for bit, param in enumerate(self.search_params[table]) if present >> bit & 1)
+        compiled = CompiledSearch(conditions=conditions, sql=self.search_sql(table, conditions))
+        self.compiled_searches[(table, present)] = compiled
+        return compiled
+
+    def search_sql(self, table: str, conditions: tuple) -> str:
+        """
+        Forms the SQL query for a search
+        :param table: database table - contestants, episodes or seasons
+        :param conditions: SQL conditions, which are combined with AND
+        :return: SQL query
+        """
+        return self.select_and_join[table] + ' WHERE ' + " AND ".join(conditions) + self.order_by[table]
+
+    def run_search(self, table: str, conditions: tuple, condition_values: tuple, sql_query: str = None) -> List[Tuple]:
+        """
+        Executes a search query, unless the same query was answered recently
+        :param table: database table - contestants, episodes or seasons
+        :param conditions: SQL conditions, which are combined with AND
+        :param condition_values: values to bind to the conditions
+        :param sql_query: SQL query for the conditions, if already compiled
+        :return: list of tuples containing search results
+        """
+        if self.file_version() != self.loaded_version:
+            self.reload()
+        cache_key = (table, conditions, condition_values)
+        matching = self.search_cache.get(cache_key)
+        if matching is None:
+            if sql_query is None:
+                sql_query = self.search_sql(table, conditions)
+            cursor = self.pool.connection().cursor()
+            if self.explain:
+                self.log_query_plan(cursor, sql_query, condition_values)
+            start = time.perf_counter()
+            matching = cursor.execute(sql_query, condition_values).fetchall()
+            metrics.registry.observe_stage('sql', time.perf_counter() - start)
+            metrics.registry.inc('queries_total', table=table)
+            self.search_cache.put(cache_key, matching)
         return matching
+
+    def iter_rows(self, table: str, conditions: tuple = (), condition_values: tuple = (), after_id: int = None,
+                  limit: int = None) -> Iterator[Tuple[int, tuple]]:
+        """
+        Streams matching rows straight from the cursor, in ID order, without building the whole result in memory
+        :param table: database table - contestants, episodes or seasons
+        :param conditions: SQL conditions, which are combined with AND
+        :param condition_values: values to bind to the conditions
+        :param after_id: only include rows with a greater ID (keyset pagination)
+        :param limit: maximum number of rows to return
+        :return: iterator of (row ID, row) tuples
+        """
+        if self.file_version() != self.loaded_version:
+            self.reload()
+        if after_id is not None:
+            conditions = conditions + (self.id_columns[table] + ' > ?',)
+            condition_values = condition_values + (after_id,)
+        sql_query = self.select_with_id[table]
+        if conditions:
+            sql_query += ' WHERE ' + " AND ".join(conditions)
+        sql_query += self.order_by[table]
+        if limit is not None:
+            sql_query += ' LIMIT ?'
+            condition_values = condition_values + (limit,)
+        cursor = self.pool.connection().cursor()
+        if self.explain:
+            self.log_query_plan(cursor, sql_query, condition_values)
+        metrics.registry.inc('queries_total', table=table)
+        for row in cursor.execute(sql_query, condition_values):
+            yield row[0], row[1:]
+
+    def batch_search(self, table: str, arg_lists: List[list]) -> list:
+        """
+        Runs many searches on one table. Searches that differ only in their season are merged into a single query
+        with `season IN (...)`, and its rows are split back up by season.
+        :param table: database table - contestants, episodes or seasons
+        :param arg_lists: list of positional arguments for search_contestants, search_episodes or search_seasons
+        :return: list with the result of each search, in the same order
+        """
+        season_condition = season_conditions[table]
+        results = [None] * len(arg_lists)
+        mergeable = {}
+        for i, args in enumerate(arg_lists):
+            conditions, condition_values = self.search_conditions(table, args)
+            season = None
+            if season_condition in conditions:
+                position = conditions.index(season_condition)
+                value_position = sum(condition.count('?') for condition in conditions[:position])
+                # a season SQLite can't bind in the merged IN (...) is searched on its own
+                season = validate_sqlite_integer(condition_values[value_position])
+            if season is None:
+                results[i] = self.run_search(table, conditions, condition_values) if conditions else None
+                continue
+            # searches with the same conditions apart from the season can share one query
+            group_key = (conditions[:position] + conditions[position + 1:],
+                         condition_values[:value_position] + condition_values[value_position + 1:])
+            mergeable.setdefault(group_key, []).append((i, season, conditions, condition_values))
+        for (other_conditions, other_values), searches in mergeable.items():
+            seasons = sorted({season for _, season, _, _ in searches})
+            in_condition = season_condition.replace('=?', ' IN ({})'.format(', '.join('?' * len(seasons))))
+            rows = self.run_search(table, other_conditions + (in_condition,), other_values + tuple(seasons))
+            rows_by_season = {season: [] for season in seasons}
+            for row in rows:
+                # season is the last column selected from every table
+                rows_by_season[row[-1]].append(row)
+            for i, season, conditions, condition_values in searches:
+                results[i] = rows_by_season[season]
+                self.search_cache.put((table, conditions, condition_values), rows_by_season[season])
+        return [self.rank_by_name(table, args, rows) for args, rows in zip(arg_lists, results)]
+
+    @staticmethod
+    def log_query_plan(cursor: sqlite3.Cursor, sql_query: str, condition_values: tuple):
+        """
+        Logs how SQLite will run a query, e.g. which indexes it uses
+        :param cursor: cursor to run EXPLAIN QUERY PLAN with
+        :param sql_query: query to explain
+        :param condition_values: values bound to the query
+        """
+        plan = cursor.execute('EXPLAIN QUERY PLAN ' + sql_query, condition_values).fetchall()
+        logger.debug('Query plan for %s %s:\n%s', ' '.join(sql_query.split()), condition_values,
+                     '\n'.join(detail for _, _, _, detail in plan))
+
+
+if __name__ == '__main__':
+    import argparse
+    from franchises import default_franchise, franchises
+    parser = argparse.ArgumentParser(description="Builds a franchise's database from its CSV files")
+    parser.add_argument('--sync', action='store_true', help='only apply changes to the existing database')
+    parser.add_argument('--franchise', choices=list(franchises), default=default_franchise,
+                        help='franchise to build; the default builds drag_race.db from data/')
+    parser.add_argument('--snapshot', action='store_true',
+                        help='publish an immutable snapshot of the result for servers run with DRAG_RACE_SNAPSHOTS=1')
+    cli_args = parser.parse_args()
+    franchise = franchises[cli_args.franchise]
+    database = Database(franchise.db_name, data_dir=franchise.data_dir, snapshots=cli_args.snapshot)
+    if cli_args.sync:
+        print(database.sync_database(reload=False))
+    else:
+        database.create_database()
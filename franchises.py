@@ -0,0 +1,32 @@
+"""Registry of the Drag Race franchises. Each franchise is scraped into its own CSV directory and built into its own
+SQLite database, so searching one franchise never touches another's tables. Used by app.py, database.py and
+scraper.py"""
+import os
+from collections import namedtuple
+from typing import List
+
+# num_seasons and season_url are what the scraper reads; data_dir and db_name are where the CSVs and database live
+FranchiseInfo = namedtuple('FranchiseInfo', ['name', 'num_seasons', 'season_url', 'data_dir', 'db_name'])
+
+# franchise served by the routes without a franchise prefix, e.g. /search/contestants
+default_franchise = 'us'
+
+franchises = {
+    'us': FranchiseInfo("RuPaul's Drag Race", 13, 'https://en.wikipedia.org/wiki/RuPaul%27s_Drag_Race_(season_{})',
+                        'data', 'drag_race.db'),
+    'all-stars': FranchiseInfo("RuPaul's Drag Race All Stars", 5,
+                               'https://en.wikipedia.org/wiki/RuPaul%27s_Drag_Race_All_Stars_(season_{})',
+                               'data/all-stars', 'drag_race_all_stars.db'),
+    'uk': FranchiseInfo("RuPaul's Drag Race UK", 2, 'https://en.wikipedia.org/wiki/RuPaul%27s_Drag_Race_UK_(series_{})',
+                        'data/uk', 'drag_race_uk.db'),
+    'canada': FranchiseInfo("Canada's Drag Race", 1, 'https://en.wikipedia.org/wiki/Canada%27s_Drag_Race_(season_{})',
+                            'data/canada', 'drag_race_canada.db'),
+}
+
+
+def available_franchises() -> List[str]:
+    """
+    Finds the franchises whose database has been built
+    :return: list of franchise slugs, in registry order
+    """
+    return [slug for slug, info in franchises.items() if os.path.exists(info.db_name)]
@@ -0,0 +1,10 @@
+"""Column names of the CSV files and JSON responses. Kept apart from scraper.py so serving doesn't import the scraping
+dependencies."""
+
+file_headers = {'episodes': 'number,title,date,winner,main_challenge,season',
+                'contestants': 'name,age,hometown,outcome,season',
+                'seasons': 'number,winner'}
+# fields of each row in the JSON responses, in the order the database selects them
+result_headers = {'episodes': file_headers['episodes'],
+                  'contestants': file_headers['contestants'],
+                  'seasons': 'winner,episodes,contestants,season'}
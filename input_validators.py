@@ -1,6 +1,19 @@
 """Contains functions to process and/or validate search parameters input by the user. Used by database.py"""
 import datetime
-from typing import Union
+import logging
+import re
+from typing import List, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# separates the values of a list parameter, e.g. season=3,5,9
+list_separator = ','
+# an inclusive integer range, e.g. season=4-8
+integer_range = re.compile(r'\s*(\d+)\s*-\s*(\d+)\s*')
+# most values a list parameter may expand to, so season=1-100000,1 can't build a huge query
+max_list_values = 1000
+# range of a SQLite INTEGER; sqlite3 raises OverflowError when binding an int outside it
+min_sqlite_integer, max_sqlite_integer = -2 ** 63, 2 ** 63 - 1
 
 
 def process_outcome_search(searched_outcome: str) -> str:
@@ -19,6 +32,32 @@ def process_outcome_search(searched_outcome: str) -> str:
     return searched_outcome
 
 
+def process_single_outcome(searched_outcome: str) -> Union[str, None]:
+    """
+    Processes an outcome parameter holding a single outcome, like process_outcome_search
+    :param searched_outcome: user-provided value for `outcome` to search
+    :return: processed string for `outcome`, or None if it is a list of outcomes
+    """
+    if list_separator in searched_outcome:
+        return None
+    return process_outcome_search(searched_outcome)
+
+
+def parse_outcome_list(searched_outcomes: str) -> Union[List[str], None]:
+    """
+    Parses an outcome parameter holding a comma-separated list of outcomes, e.g. Winner,Runner-Up,3rd
+    :param searched_outcomes: user-provided value for `outcome` to search
+    :return: list of processed outcomes, or None if the value is a single outcome or has too many
+    """
+    if list_separator not in searched_outcomes:
+        return None
+    outcomes = [process_outcome_search(outcome.strip()) for outcome in searched_outcomes.split(list_separator)
+                if outcome.strip()]
+    if not outcomes or len(outcomes) > max_list_values:
+        return None
+    return sorted(set(outcomes))
+
+
 def add_wildcards(string: str) -> str:
     """
     Prepends and appends a '%' to the string, which represents a SQL wildcard
@@ -41,6 +80,73 @@ def validate_integer_input(parameter: str) -> Union[None, int]:
     return result
 
 
+def validate_sqlite_integer(parameter: str) -> Union[None, int]:
+    """
+    Converts string input to an integer that SQLite can compare with, like validate_integer_input
+    :param parameter: string input
+    :return: `parameter` converted to integer, or None if it can't be converted or is out of SQLite's range
+    """
+    result = validate_integer_input(parameter)
+    if result is None or not min_sqlite_integer <= result <= max_sqlite_integer:
+        return None
+    return result
+
+
+def single_value(parameter: str) -> Union[str, None]:
+    """
+    Passes on a parameter holding a single value, which is compared as it is
+    :param parameter: user-provided value
+    :return: `parameter`, or None if it is a list or a range
+    """
+    if list_separator in str(parameter) or integer_range.fullmatch(str(parameter)):
+        return None
+    return parameter
+
+
+def parse_integer_range(parameter: str) -> Union[Tuple[int, int], None]:
+    """
+    Parses a parameter holding an inclusive range of integers, e.g. 4-8
+    :param parameter: user-provided value
+    :return: tuple of the lowest and highest value, or None if it isn't a range, the range is empty or a bound is out
+    of SQLite's range
+    """
+    match = integer_range.fullmatch(str(parameter))
+    if not match:
+        return None
+    low, high = validate_sqlite_integer(match.group(1)), validate_sqlite_integer(match.group(2))
+    if low is None or high is None:
+        return None
+    return (low, high) if low <= high else None
+
+
+def parse_integer_list(parameter: str) -> Union[List[int], None]:
+    """
+    Parses a parameter holding a comma-separated list of integers and ranges, e.g. 3,5,9 or 1-3,7
+    :param parameter: user-provided value
+    :return: sorted list of the distinct values, or None if it isn't a list, has an invalid or out of range value or
+    has too many
+    """
+    if list_separator not in str(parameter):
+        return None
+    values = set()
+    for part in str(parameter).split(list_separator):
+        if not part.strip():
+            continue
+        value_range = parse_integer_range(part)
+        if value_range:
+            if value_range[1] - value_range[0] >= max_list_values:
+                return None
+            values.update(range(value_range[0], value_range[1] + 1))
+        else:
+            value = validate_sqlite_integer(part)
+            if value is None:
+                return None
+            values.add(value)
+        if len(values) > max_list_values:
+            return None
+    return sorted(values) or None
+
+
 def is_valid_date(date_str) -> Union[str, None]:
     """
     Checks if `date_str` is a valid date in format YYYY-MM-DD
@@ -51,5 +157,18 @@ def is_valid_date(date_str) -> Union[str, None]:
         datetime.datetime.strptime(date_str, '%Y-%m-%d')
         return date_str
     except ValueError:
-        print('invalid date')
+        logger.debug('event=invalid_date value=%r', date_str)
+        return None
+
+
+def date_key(date_str) -> Union[int, None]:
+    """
+    Converts a date in format YYYY-MM-DD to the integer YYYYMMDD, which sorts in date order. The database stores the
+    air dates of episodes in this form, so date searches compare integers.
+    :param date_str: user-input search parameter or date from the CSV data
+    :return: integer date, or None if not a valid date
+    """
+    if not is_valid_date(date_str):
         return None
+    year, month, day = (int(part) for part in date_str.split('-'))
+    return year * 10000 + month * 100 + day
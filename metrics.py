@@ -0,0 +1,192 @@
+"""Instrumentation for the API: counters and stage timers served by the /metrics route in the Prometheus text format,
+and an opt-in per-request profiler. Used by app.py, asgi.py and database.py."""
+import bisect
+import cProfile
+import logging
+import os
+import threading
+import time
+from typing import Callable, Iterable, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# upper bounds of the duration histogram buckets, in seconds
+duration_buckets = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+# type and help text of every metric, without the prefix
+metric_info = {
+    'requests_total': ('counter', 'HTTP requests served, by endpoint and status code'),
+    'request_duration_seconds': ('histogram', 'Time to build each HTTP response, by endpoint'),
+    'stage_duration_seconds': ('histogram', 'Time spent in each stage of a request: validate, sql, make_list, jsonify'),
+    'queries_total': ('counter', 'SQL search queries run, by table'),
+    'cache_hits_total': ('counter', 'Cache lookups answered from the cache'),
+    'cache_misses_total': ('counter', 'Cache lookups that had to query the database'),
+    'cache_evictions_total': ('counter', 'Entries dropped because the cache was full'),
+    'cache_entries': ('gauge', 'Entries currently cached'),
+}
+
+# a sample from a collector: metric name, labels and value
+Sample = Tuple[str, dict, float]
+
+
+class Histogram:
+    def __init__(self):
+        """
+        Counts observed durations per bucket, plus their number and sum
+        """
+        self.bucket_counts = [0] * (len(duration_buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float):
+        """
+        Records one duration
+        :param seconds: duration
+        """
+        self.bucket_counts[bisect.bisect_left(duration_buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+
+class Metrics:
+    def __init__(self, prefix: str = 'drag_race'):
+        """
+        Registry of counters and duration histograms. Updates are cheap enough for the request path: a lock and a
+        dictionary lookup.
+        :param prefix: prefix of every metric name
+        """
+        self.prefix = prefix
+        self.counters = {}
+        self.histograms = {}
+        self.collectors = []
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        """
+        Increments a counter
+        :param name: metric name, a key of metric_info
+        :param amount: amount to add
+        :param labels: label names and values
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name: str, seconds: float, **labels):
+        """
+        Records a duration in a histogram
+        :param name: metric name, a key of metric_info
+        :param seconds: duration
+        :param labels: label names and values
+        """
+        self.observe_key((name, tuple(sorted(labels.items()))), seconds)
+
+    def observe_stage(self, stage: str, seconds: float):
+        """
+        Records the time spent in one stage of a request. Called several times per request, so it skips building
+        the labels from keyword arguments.
+        :param stage: validate, sql, make_list or jsonify
+        :param seconds: duration
+        """
+        self.observe_key(('stage_duration_seconds', (('stage', stage),)), seconds)
+
+    def observe_key(self, key: tuple, seconds: float):
+        """
+        Records a duration in the histogram with the given key
+        :param key: tuple of the metric name and its sorted (label, value) pairs
+        :param seconds: duration
+        """
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def add_collector(self, collector: Callable[[], Iterable[Sample]]):
+        """
+        Adds a function that is called on every scrape for values kept elsewhere, e.g. cache counters
+        :param collector: function returning (metric name, labels, value) samples
+        """
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        """
+        Formats every metric in the Prometheus text exposition format
+        :return: response body for /metrics
+        """
+        with self._lock:
+            samples = [(name, dict(labels), value) for (name, labels), value in self.counters.items()]
+            histograms = [(name, dict(labels), histogram.bucket_counts[:], histogram.count, histogram.sum)
+                          for (name, labels), histogram in self.histograms.items()]
+        for collector in self.collectors:
+            samples.extend(collector())
+        lines = {name: [] for name in metric_info}
+        for name, labels, value in samples:
+            lines[name].append(self.format_sample(name, labels, value))
+        for name, labels, bucket_counts, count, total in histograms:
+            cumulative = 0
+            for bound, bucket_count in zip(duration_buckets + ('+Inf',), bucket_counts):
+                cumulative += bucket_count
+                lines[name].append(self.format_sample(name + '_bucket', dict(labels, le=bound), cumulative))
+            lines[name].append(self.format_sample(name + '_sum', labels, total))
+            lines[name].append(self.format_sample(name + '_count', labels, count))
+        output = []
+        for name, (kind, help_text) in metric_info.items():
+            if lines[name]:
+                output.append('# HELP {}_{} {}'.format(self.prefix, name, help_text))
+                output.append('# TYPE {}_{} {}'.format(self.prefix, name, kind))
+                output.extend(sorted(lines[name]) if kind != 'histogram' else lines[name])
+        return '\n'.join(output) + '\n'
+
+    def format_sample(self, name: str, labels: dict, value: float) -> str:
+        """
+        Formats one sample line
+        :param name: metric name, without the prefix
+        :param labels: label names and values
+        :param value: sample value
+        :return: line of the exposition format
+        """
+        label_text = ','.join('{}="{}"'.format(label, str(label_value).replace('\\', '\\\\').replace('"', '\\"')
+                                               .replace('\n', '\\n'))
+                              for label, label_value in sorted(labels.items()))
+        return '{}_{}{} {}'.format(self.prefix, name, '{' + label_text + '}' if label_text else '', value)
+
+    def clear(self):
+        """
+        Resets every counter and histogram. Collectors are kept.
+        """
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+registry = Metrics()
+
+
+def start_profile() -> Union[cProfile.Profile, None]:
+    """
+    Starts profiling the calling thread
+    :return: the running profiler, or None if another profiler is already active
+    """
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        return None
+    return profile
+
+
+def dump_profile(profile: cProfile.Profile, directory: str, name: str) -> str:
+    """
+    Stops a profiler and writes its statistics to a file, which can be read with pstats or snakeviz
+    :param profile: profiler returned by start_profile
+    :param directory: directory for the profile files
+    :param name: name of what was profiled, e.g. the endpoint; used in the file name
+    :return: path of the written file
+    """
+    profile.disable()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, '{}-{}.prof'.format(name, time.time_ns()))
+    profile.dump_stats(path)
+    logger.info('event=profile_written name=%s path=%s', name, path)
+    return path
@@ -0,0 +1,231 @@
+"""In-memory index of contestant names for prefix, substring and typo-tolerant name searches, ranked by similarity.
+Built by database.Database when it loads the database file; also used by columnar.py and app.py's autocomplete."""
+import bisect
+import functools
+import math
+import re
+import unicodedata
+from typing import Iterable, List, Tuple
+
+# how a name matched a query, best first
+EXACT, NAME_PREFIX, WORD_PREFIX, SUBSTRING, FUZZY = range(5)
+
+# share of the query's trigrams a name needs for a typo-tolerant match
+min_similarity = 0.6
+# shortest query that is matched with typos; shorter ones have too few trigrams to tell names apart
+min_fuzzy_length = 4
+# characters dropped by fold
+punctuation = re.compile(r'[^\w\s]|_')
+# searches remembered per index; the cache is dropped when the database's names change
+cache_size = 1024
+
+
+def fold(text: str) -> str:
+    """
+    Normalizes text for matching: lowercased, without accents or punctuation, and with single spaces between words,
+    so "Monét X Change" matches "monet x change" and "A'keria" matches "akeria"
+    :param text: name or query
+    :return: folded text
+    """
+    if not text.isascii():
+        text = ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+    return ' '.join(punctuation.sub('', text).casefold().split())
+
+
+def trigrams(folded: str) -> set:
+    """
+    Splits folded text into the trigrams of each word, padded like PostgreSQL's pg_trgm: two spaces before and one
+    after the word, so word starts weigh more than word ends
+    :param folded: text returned by fold
+    :return: set of three-character strings
+    """
+    grams = set()
+    for word in folded.split():
+        padded = '  ' + word + ' '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class NameIndex:
+    def __init__(self, rows: Iterable[Tuple[int, str]], previous: 'NameIndex' = None):
+        """
+        Indexes names by their trigrams, and by the text from the start of each word in sorted order for prefix
+        lookups
+        :param rows: (row ID, name) pairs; a name shared by several rows is indexed once
+        :param previous: index of an earlier version of the rows. If the rows only add names after its names, e.g. a
+        new season, its entries are reused and only the new names are indexed.
+        """
+        self.row_ids = {}
+        for row_id, name in rows:
+            if name:
+                self.row_ids.setdefault(name, []).append(row_id)
+        self.names = list(self.row_ids)
+        if previous is not None and self.names[:len(previous.names)] == previous.names:
+            start = len(previous.names)
+            self.folded = previous.folded + [fold(name) for name in self.names[start:]]
+            self.grams = previous.grams + [trigrams(folded) for folded in self.folded[start:]]
+            # the previous index may still be searched by other threads, so its lists are copied before appending
+            self.postings = extend_postings(previous.postings, self.grams[start:], start)
+            self.char_postings = extend_postings(previous.char_postings,
+                                                 [set(folded) for folded in self.folded[start:]], start)
+            self.word_starts = previous.word_starts[:]
+            for entry in word_starts(self.folded, start):
+                bisect.insort(self.word_starts, entry)
+            if start == len(self.names):
+                # same names, so the same search results
+                self.search = previous.search
+                return
+        else:
+            self.folded = [fold(name) for name in self.names]
+            self.grams = [trigrams(folded) for folded in self.folded]
+            self.postings = extend_postings({}, self.grams)
+            # positions of the names containing each character, for queries too short to have a trigram
+            self.char_postings = extend_postings({}, [set(folded) for folded in self.folded])
+            # (text from a word start to the end of the name, position); a query is a word prefix of the names whose
+            # entries start with it, which sit next to each other in sorted order
+            self.word_starts = sorted(word_starts(self.folded))
+        self.search = functools.lru_cache(maxsize=cache_size)(self._search)
+
+    def _search(self, query: str) -> Tuple[str, ...]:
+        """
+        Finds the names matching a query. Exact matches come first, then names starting with the query, names with a
+        word starting with it, and names containing it. Only if no name contains the query are names matched with
+        typos. Matches of the same kind are ranked by similarity to the query: for names containing the query, the
+        shortest are the closest; typo matches are ranked by trigram similarity. Cached, see `search`.
+        :param query: text to search for
+        :return: tuple of matching names, best match first
+        """
+        folded_query = fold(query)
+        if not folded_query:
+            return ()
+        kinds = {}
+        for position in self.prefix_matches(folded_query):
+            folded = self.folded[position]
+            kinds[position] = EXACT if folded == folded_query else NAME_PREFIX if folded.startswith(folded_query) \
+                else WORD_PREFIX
+        for position in self.substring_matches(folded_query):
+            kinds.setdefault(position, SUBSTRING)
+        if kinds:
+            ranked = sorted(kinds, key=lambda position: (kinds[position], len(self.folded[position]),
+                                                         self.folded[position]))
+        elif len(folded_query) >= min_fuzzy_length:
+            query_grams = trigrams(folded_query)
+            ranked = sorted(self.fuzzy_matches(query_grams),
+                            key=lambda position: (-self.similarity(query_grams, position), self.folded[position]))
+        else:
+            ranked = []
+        return tuple(self.names[position] for position in ranked)
+
+    def prefix_matches(self, folded_query: str) -> List[int]:
+        """
+        Finds the names with a word starting with the query, by binary search of the sorted word starts
+        :param folded_query: folded query
+        :return: positions of the matching names, possibly repeated
+        """
+        positions = []
+        for i in range(bisect.bisect_left(self.word_starts, (folded_query,)), len(self.word_starts)):
+            text, position = self.word_starts[i]
+            if not text.startswith(folded_query):
+                break
+            positions.append(position)
+        return positions
+
+    def substring_matches(self, folded_query: str) -> List[int]:
+        """
+        Finds the names containing the query. A name containing the query has every trigram of the query that lies
+        within a word, so only the names with the rarest of them are checked. Queries without such a trigram, e.g.
+        shorter than three characters, check the names with their rarest character instead.
+        :param folded_query: folded query
+        :return: positions of the matching names
+        """
+        grams = [folded_query[i:i + 3] for i in range(len(folded_query) - 2) if folded_query[i + 1] != ' ']
+        if grams:
+            candidates = min((self.postings.get(gram, []) for gram in grams), key=len)
+        else:
+            candidates = min((self.char_postings.get(char, []) for char in folded_query), key=len)
+        return [position for position in candidates if folded_query in self.folded[position]]
+
+    def fuzzy_matches(self, query_grams: set) -> List[int]:
+        """
+        Finds the names sharing at least min_similarity of the query's trigrams. A name sharing `needed` of them must
+        have one of the len(query_grams) - needed + 1 rarest, so only names with those are counted.
+        :param query_grams: trigrams of the folded query
+        :return: positions of the matching names
+        """
+        needed = math.ceil(min_similarity * len(query_grams))
+        postings = sorted((self.postings.get(gram, []) for gram in query_grams), key=len)
+        candidates = set().union(*postings[:len(query_grams) - needed + 1])
+        return [position for position in candidates if len(query_grams & self.grams[position]) >= needed]
+
+    def similarity(self, query_grams: set, position: int) -> float:
+        """
+        Trigram similarity of a query and a name: the shared trigrams as a share of all trigrams of either
+        :param query_grams: trigrams of the folded query
+        :param position: position of the name
+        :return: similarity from 0 to 1
+        """
+        shared = len(query_grams & self.grams[position])
+        return shared / (len(query_grams) + len(self.grams[position]) - shared)
+
+    def search_ids(self, query: str) -> List[int]:
+        """
+        Finds the rows whose name matches a query
+        :param query: text to search for
+        :return: row IDs of the matching names, best match first
+        """
+        return [row_id for name in self.search(query) for row_id in self.row_ids[name]]
+
+    def complete(self, query: str, limit: int) -> List[str]:
+        """
+        Suggests names for a partially typed query
+        :param query: text typed so far
+        :param limit: most suggestions to return
+        :return: best matching names, best first
+        """
+        return list(self.search(query)[:limit])
+
+
+def extend_postings(postings: dict, keys: List[set], start: int = 0) -> dict:
+    """
+    Adds names to the postings of their trigrams or characters, leaving `postings` itself unchanged
+    :param postings: lists of name positions, keyed by trigram or character
+    :param keys: trigrams or characters of each added name
+    :param start: position of the first added name
+    :return: new postings, sharing the lists no name was added to
+    """
+    extended = dict(postings)
+    copied = set()
+    for position, name_keys in enumerate(keys, start):
+        for key in name_keys:
+            if key not in copied:
+                extended[key] = extended.get(key, [])[:]
+                copied.add(key)
+            extended[key].append(position)
+    return extended
+
+
+def word_starts(folded_names: List[str], start: int = 0) -> List[Tuple[str, int]]:
+    """
+    Lists the text from the start of each word to the end of the name, for prefix lookups
+    :param folded_names: folded names
+    :param start: position of the first name to list
+    :return: list of (text, position) tuples, unsorted
+    """
+    entries = []
+    for position in range(start, len(folded_names)):
+        folded = folded_names[position]
+        entries += [(folded[word_start:], position)
+                    for word_start in [0] + [i + 1 for i, char in enumerate(folded) if char == ' ']]
+    return entries
+
+
+def rank_rows(rows: List[Tuple], names: Tuple[str, ...], column: int) -> List[Tuple]:
+    """
+    Orders search results by how well their name matched. Rows with the same name keep their order.
+    :param rows: search results
+    :param names: matching names, best first, as returned by NameIndex.search
+    :param column: position of the name in each row
+    :return: new list of the rows, best match first
+    """
+    rank = {name: i for i, name in enumerate(names)}
+    return sorted(rows, key=lambda row: rank.get(row[column], len(rank)))
@@ -1,7 +1,28 @@
-"""Contains function to transform data received from SQL query to data suitable for JSONifying. Used by app.py"""
+"""Contains functions to transform data received from SQL query to data suitable for JSONifying, and to encode it as
+JSON directly. Used by app.py"""
 
-from typing import Tuple, List
-from scraper import file_headers
+import json
+from collections import namedtuple
+from json.encoder import encode_basestring_ascii
+from typing import Tuple, List, Iterable
+from headers import result_headers
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# rows from a database search, placed in response data to be encoded straight to JSON; response_format is rows for a
+# list of objects or columns for one array per field
+Rows = namedtuple('Rows', ['table', 'rows', 'response_format'], defaults=['rows'])
+
+# field names of each table's rows, split once instead of for every row
+row_keys = {table: tuple(headers.split(',')) for table, headers in result_headers.items()}
+# positions of the fields in key order, which is the order Flask's JSON provider writes them in
+sorted_positions = {table: sorted(range(len(keys)), key=keys.__getitem__) for table, keys in row_keys.items()}
+# format string for one JSON row object, with a {} for each encoded value
+row_templates = {table: '{{' + ','.join('"{}":{{}}'.format(row_keys[table][i]) for i in positions) + '}}'
+                 for table, positions in sorted_positions.items()}
 
 
 def make_dict(tup: Tuple, table: str) -> dict:
@@ -11,8 +32,7 @@ def make_dict(tup: Tuple, table: str) -> dict:
     :param table: string indicating which table the data is from
     :return: dictionary of contestant data
     """
-    key_list = file_headers[table].split(",")
-    return {k: v for k, v in zip(key_list, tup)}
+    return dict(zip(row_keys[table], tup))
 
 
 def make_list(table: str, search_result: List[Tuple]) -> List[dict]:
@@ -23,3 +43,112 @@ def make_list(table: str, search_result: List[Tuple]) -> List[dict]:
     :return: list of dictionaries, where each dictionary represents one table row
     """
     return [make_dict(row, table) for row in search_result]
+
+
+def make_columns(table: str, search_result: List[Tuple]) -> dict:
+    """
+    Converts list of tuples to the columnar format
+    :param table: table data came from
+    :param search_result: list of tuples generated from database search
+    :return: dictionary mapping each field to the list of its values
+    """
+    if not search_result:
+        return {key: [] for key in row_keys[table]}
+    return dict(zip(row_keys[table], map(list, zip(*search_result))))
+
+
+def expand_rows(data):
+    """
+    Replaces the Rows in response data with lists of dictionaries or columns, for encoders other than encode_json
+    :param data: response data
+    :return: data that any JSON encoder can encode
+    """
+    if type(data) is Rows:
+        if data.response_format == 'columns':
+            return make_columns(data.table, data.rows)
+        return make_list(data.table, data.rows)
+    if type(data) is dict:
+        return {key: expand_rows(value) for key, value in data.items()}
+    if type(data) is list:
+        return [expand_rows(value) for value in data]
+    return data
+
+
+def encode_json(data) -> str:
+    """
+    Encodes response data as compact JSON with sorted keys and only ASCII characters, the same text Flask's default
+    JSON provider writes for expand_rows(data). Rows are encoded without building a dictionary per row.
+    :param data: dictionaries, lists, Rows and the values in database rows
+    :return: JSON text
+    """
+    if type(data) is Rows:
+        if data.response_format == 'columns':
+            return encode_columns(data.table, data.rows)
+        return encode_rows(data.table, data.rows)
+    if type(data) is dict:
+        return encode_object((key, encode_json(value)) for key, value in data.items())
+    if type(data) is list:
+        return '[' + ','.join(map(encode_json, data)) + ']'
+    return encode_value(data)
+
+
+def encode_value(value) -> str:
+    """
+    Encodes one value exactly like Flask's default JSON provider (json.dumps with ensure_ascii)
+    :param value: value from a database row
+    :return: JSON text
+    """
+    if type(value) is str:
+        return encode_basestring_ascii(value)
+    if value is None:
+        return 'null'
+    if type(value) is int:
+        return int.__repr__(value)
+    return json.dumps(value)
+
+
+def encode_row(table: str, row: Tuple) -> str:
+    """
+    Encodes one row as a JSON object, the same text as encoding make_dict(row, table) with Flask's compact, sorted
+    output, without building the dictionary
+    :param table: table the row came from
+    :param row: tuple from a database search
+    :return: JSON text
+    """
+    return row_templates[table].format(*[encode_value(row[i]) for i in sorted_positions[table]])
+
+
+def encode_rows(table: str, rows: List[Tuple]) -> str:
+    """
+    Encodes rows as a JSON array of objects. Works a column at a time, which is faster than encoding row by row.
+    :param table: table the rows came from
+    :param rows: tuples from a database search
+    :return: JSON text
+    """
+    if not rows:
+        return '[]'
+    columns = list(zip(*rows))
+    encoded = [list(map(encode_value, columns[i])) for i in sorted_positions[table]]
+    return '[' + ','.join(map(row_templates[table].format, *encoded)) + ']'
+
+
+def encode_object(fields: Iterable[Tuple[str, str]]) -> str:
+    """
+    Builds a JSON object from already encoded values, with the keys sorted like Flask's JSON provider sorts them
+    :param fields: pairs of key and JSON text
+    :return: JSON text
+    """
+    return '{' + ','.join(encode_basestring_ascii(key) + ':' + text for key, text in sorted(fields)) + '}'
+
+
+def encode_columns(table: str, rows: List[Tuple]) -> str:
+    """
+    Encodes rows in the columnar format: a JSON object with one array per field. Uses orjson when it is installed,
+    which writes non-ASCII characters as UTF-8 instead of escaping them.
+    :param table: table the rows came from
+    :param rows: tuples from a database search
+    :return: JSON text
+    """
+    if orjson is not None:
+        return orjson.dumps(make_columns(table, rows), option=orjson.OPT_SORT_KEYS).decode()
+    return json.dumps(make_columns(table, rows), separators=(',', ':'), sort_keys=True)
@@ -1,37 +1,150 @@
+import argparse
+import hashlib
+import importlib.util
+import json
+import logging
+import os
 import requests
 from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from headers import file_headers
+from franchises import default_franchise, franchises
 
 episode_file = 'data/episodes1.csv'
 season_file = 'data/seasons.csv'
-file_headers = {'episodes': 'number,title,date,winner,main_challenge,season',
-                'contestants': 'name,age,hometown,outcome,season',
-                'seasons': 'number,winner'}
+cache_dir = 'data/html_cache'
+contestants_url = "https://en.wikipedia.org/wiki/List_of_RuPaul%27s_Drag_Race_contestants"
+# lxml parses much faster than the pure-Python html.parser, but is optional
+html_parser = 'lxml' if importlib.util.find_spec('lxml') else 'html.parser'
+logger = logging.getLogger(__name__)
 
 
 class Franchise:
-    def __init__(self, name: str, num_seasons: int, base_url: str):
+    def __init__(self, name: str, num_seasons: int, base_url: str, data_dir: str = 'data'):
         self.name = name
         self.num_seasons = num_seasons
         self.base_url = base_url
+        self.data_dir = data_dir
 
-    def get_season_data(self):
-        with open(episode_file, 'w') as ef:
+    def season_urls(self) -> List[str]:
+        """
+        :return: Wikipedia URL of each season
+        """
+        return [self.base_url.format(i) for i in range(1, self.num_seasons + 1)]
+
+    def get_season_data(self, page_cache: 'PageCache' = None, workers: int = 8):
+        """
+        Downloads the season pages concurrently, then parses them and writes the episode and season CSVs in order
+        :param page_cache: cache to fetch the pages through; defaults to an online PageCache
+        :param workers: number of pages to download at the same time
+        """
+        page_cache = page_cache or PageCache()
+        urls = self.season_urls()
+        pages = page_cache.fetch_all(urls, workers)
+        os.makedirs(self.data_dir, exist_ok=True)
+        franchise_episode_file = os.path.join(self.data_dir, os.path.basename(episode_file))
+        franchise_season_file = os.path.join(self.data_dir, os.path.basename(season_file))
+        with open(franchise_episode_file, 'w') as ef:
             # write header row
             ef.write(file_headers['episodes'] + '\n')
-        with open(season_file, 'w') as sf:
+        with open(franchise_season_file, 'w') as sf:
             # write header row
             sf.write(file_headers['seasons'] + '\n')
-        for i in range(1, self.num_seasons + 1):
-            season = Season(self.base_url.format(i), i)
-            season.write_episode_data()
+        for i, (url, html) in enumerate(zip(urls, pages), 1):
+            season = Season(url, i, html)
+            season.write_episode_data(franchise_episode_file)
+            season.write_season_data(franchise_season_file)
+
+
+class PageCache:
+    def __init__(self, directory: str = cache_dir, offline: bool = False):
+        """
+        Stores downloaded HTML on disk, keyed by URL. Cached pages are revalidated with If-None-Match/If-Modified-Since,
+        so unchanged pages aren't downloaded again. In offline mode pages are only read from the cache.
+        :param directory: directory for the cached pages
+        :param offline: if True, never use the network
+        """
+        self.directory = directory
+        self.offline = offline
+        # pages already fetched in this run, so they aren't revalidated twice
+        self.pages = {}
+        # one pooled session, so concurrent downloads reuse connections to Wikipedia
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=32)
+        self.session.mount('https://', adapter)
+
+    def path(self, url: str) -> str:
+        """
+        Gets the cache file path for a URL, without extension
+        :param url: page URL
+        :return: path of the cached page
+        """
+        return os.path.join(self.directory, hashlib.sha1(url.encode()).hexdigest())
+
+    def get(self, url: str) -> str:
+        """
+        Gets the HTML of a page from the cache, downloading or revalidating it unless in offline mode
+        :param url: page URL
+        :return: page HTML
+        """
+        if url in self.pages:
+            return self.pages[url]
+        path = self.path(url)
+        cached_html = None
+        headers = {}
+        if os.path.exists(path + '.html'):
+            with open(path + '.html', encoding='utf-8') as fh:
+                cached_html = fh.read()
+            with open(path + '.json') as fh:
+                validators = json.load(fh)
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                headers['If-Modified-Since'] = validators['last_modified']
+        if self.offline:
+            if cached_html is None:
+                raise FileNotFoundError('{} is not in the page cache at {}'.format(url, self.directory))
+            self.pages[url] = cached_html
+            return cached_html
+        response = self.session.get(url, headers=headers)
+        if response.status_code == 304 and cached_html is not None:
+            self.pages[url] = cached_html
+            return cached_html
+        response.raise_for_status()
+        os.makedirs(self.directory, exist_ok=True)
+        with open(path + '.html', 'w', encoding='utf-8') as fh:
+            fh.write(response.text)
+        with open(path + '.json', 'w') as fh:
+            json.dump({'url': url, 'etag': response.headers.get('ETag'),
+                       'last_modified': response.headers.get('Last-Modified')}, fh)
+        self.pages[url] = response.text
+        return response.text
+
+    def fetch_all(self, urls: List[str], workers: int = 8) -> List[str]:
+        """
+        Gets several pages concurrently
+        :param urls: page URLs
+        :param workers: number of pages to fetch at the same time
+        :return: HTML of each page, in the same order as `urls`
+        """
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(self.get, urls))
 
 
 class Season:
-    def __init__(self, url: str, season_num: int):
+    def __init__(self, url: str, season_num: int, html: str = None):
+        """
+        Parses the episode table of a season's Wikipedia page
+        :param url: page URL
+        :param season_num: season number
+        :param html: page HTML; downloaded from `url` if not provided
+        """
         self.season_num = season_num
         self.url = url
-        response = requests.get(self.url)
-        soup = BeautifulSoup(response.text, 'html.parser')
+        if html is None:
+            html = requests.get(self.url).text
+        soup = BeautifulSoup(html, html_parser)
         episode_table = soup.find('table', class_='wikitable plainrowheaders wikiepisodetable')
         self.basic_info_rows = episode_table.find_all('tr', 'vevent')
         self.detailed_info_rows = episode_table.find_all('tr', class_='expand-child')
@@ -44,16 +157,21 @@ class Season:
             episode_list.append(Episode(basic_info_row, detailed_info_row))
         return episode_list
 
-    def write_episode_data(self):
-        with open(episode_file, 'a') as fh:
+    def write_episode_data(self, file_name: str = episode_file):
+        with open(file_name, 'a') as fh:
             for episode in self.episodes:
                 line = ",".join([str(episode.number), episode.title, episode.date, episode.winner,
                                  episode.main_challenge, str(self.season_num)]) + '\n'
                 fh.write(line)
 
+    def write_season_data(self, file_name: str = season_file):
+        if self.winner:
+            with open(file_name, 'a') as fh:
+                fh.write(str(self.season_num) + ',' + self.winner + '\n')
+
     def get_season_winner(self):
         """
-        Gets season winner from episodes table and writes to file
+        Gets season winner from episodes table
         :return: season winner
         """
         # TODO: test
@@ -61,11 +179,7 @@ class Season:
             episode_bullets = detailed_info_row.find_all('li')
             for bullet in episode_bullets:
                 if "Winner of RuPaul's Drag Race Season" in bullet.text:
-                    season_winner = get_string_after_colon(bullet.text)
-                    with open(season_file, 'a') as fh:
-                        line = str(self.season_num) + ',' + season_winner + '\n'
-                        fh.write(line)
-                    return season_winner
+                    return get_string_after_colon(bullet.text)
 
 
 class Episode:
@@ -82,7 +196,7 @@ class Episode:
         start = date_raw.find('(')
         self.date = date_raw[start + 1:start + 11]
         assert(len(self.date) == 10)
-        print(self.number, self.title, self.date)
+        logger.debug('event=episode number=%s title=%r date=%s', self.number, self.title, self.date)
         challenge_winner = detailed_info_row.find(style='color:royalblue')
         if challenge_winner:
             self.winner = get_string_after_colon(challenge_winner.text)
@@ -95,18 +209,18 @@ class Episode:
             if ('Main Challenge:' in bullet.text) or ('Maxi Challenge:' in bullet.text):
                 # add double quotes around challenge description, since it may contain commas
                 self.main_challenge = '"' + get_string_after_colon(bullet.text) + '"'
-        print(self.winner, self.main_challenge)
+        logger.debug('event=episode_winner winner=%r main_challenge=%r', self.winner, self.main_challenge)
 
 
-def get_contestant_data():
+def get_contestant_data(page_cache: PageCache = None):
     """
     Scrapes the contestant data from wikipedia
+    :param page_cache: cache to fetch the page through; defaults to an online PageCache
     """
     # get contestant table from Wikipedia
     file_name = 'data/constestants2.csv'
-    contestants_url = "https://en.wikipedia.org/wiki/List_of_RuPaul%27s_Drag_Race_contestants"
-    response = requests.get(contestants_url)
-    soup = BeautifulSoup(response.text, 'html.parser')
+    page_cache = page_cache or PageCache()
+    soup = BeautifulSoup(page_cache.get(contestants_url), html_parser)
     contestant_table = soup.find('tbody')
 
     with open(file_name, mode='w') as fh:
@@ -131,7 +245,7 @@ def get_contestant_data():
                         cell_text = cell_text[:bracket_position]
                     contestant_info.append(cell_text)
             contestant_info.append(current_season)
-            print(contestant_info)
+            logger.debug('event=contestant fields=%r', contestant_info)
             fh.write(",".join(contestant_info) + '\n')
 
 
@@ -149,6 +263,25 @@ def get_string_after_colon(string: str) -> str:
 
 
 if __name__ == '__main__':
-    drag_race_franchise = Franchise("RuPaul's Drag Race", 13,
-                                    'https://en.wikipedia.org/wiki/RuPaul%27s_Drag_Race_(season_{})')
-    drag_race_franchise.get_season_data()
+    parser = argparse.ArgumentParser(description='Scrapes Drag Race data from Wikipedia into the CSV files')
+    parser.add_argument('--offline', action='store_true', help='only use pages already in the page cache')
+    parser.add_argument('--workers', type=int, default=8, help='number of pages to download at the same time')
+    parser.add_argument('--verbose', action='store_true', help='log every scraped episode and contestant')
+    parser.add_argument('--franchise', choices=list(franchises), default=default_franchise,
+                        help='franchise to scrape the season pages of')
+    cli_args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if cli_args.verbose else logging.INFO)
+    info = franchises[cli_args.franchise]
+    drag_race_franchise = Franchise(info.name, info.num_seasons, info.season_url, info.data_dir)
+    cache = PageCache(offline=cli_args.offline)
+    if cli_args.franchise == default_franchise:
+        # download the contestants page together with the season pages
+        cache.fetch_all([contestants_url] + drag_race_franchise.season_urls(), cli_args.workers)
+    drag_race_franchise.get_season_data(cache, cli_args.workers)
+    if cli_args.franchise == default_franchise:
+        # the contestant list page only covers the main series
+        get_contestant_data(cache)
+    else:
+        logger.warning('No contestant data is scraped for %s, so `python database.py --franchise %s` needs '
+                       'contestants.csv and episodes.csv to be written to %s by hand', info.name, cli_args.franchise,
+                       info.data_dir)
@@ -0,0 +1,36 @@
+"""Search parameters that cover each search function's parsing and edge cases. benchmark.py times the backends on
+them and test_backends.py checks that the backends agree on them."""
+
+
+contestant_searches = [
+    {'name': 'mon'}, {'name': 'a_a'}, {'name': 'MONSOON'}, {'name': 'Monsoom'}, {'outcome': '1st'},
+    {'outcome': 'winner'}, {'outcome': '3'}, {'outcome': '11th'}, {'outcome': 'Disqualified'}, {'season': '4'},
+    {'season': '4.0'}, {'season': 'four'},
+    {'min_age': '30'}, {'max_age': '23'}, {'min_age': '25', 'max_age': '28', 'season': '6'},
+    {'name': 'a', 'outcome': '2nd'}, {'min_age': '0'}, {'season': '3,5,9'}, {'season': '4-8'},
+    {'season': '1-3,12,x'}, {'season': '8-4'}, {'outcome': 'Winner,Runner-Up'}, {'outcome': '3,10th'},
+    {'outcome': 'winner', 'season': '2-5'}, {'outcome': '4th'}, {'outcome': '11'}, {'outcome': '10th/11th'},
+    {'outcome': '3rd/4th,13th'}, {}]
+episode_searches = [
+    {'season': '4'}, {'after': '2014-04-07'}, {'before': '2010-01-01'}, {'after': '2014-04-07', 'before': '2015-03-02'},
+    {'after': '2014-4-7'}, {'after': 'yesterday'}, {'season': '2', 'after': '2010-03-01'},
+    {'from_date': '2014-04-07', 'to_date': '2015-03-02'}, {'season': '1,3', 'to_date': '2011-02-21'}, {}]
+season_searches = [
+    {'season': '4'}, {'season': '14'}, {'season': '2-5'}, {'winner': 'monsoon'}, {'winner': 'Monsoom'},
+    {'season': '1,13', 'winner': 'a'}, {'winner': 'x'}, {}]
+benchmark_searches = {'contestants': contestant_searches, 'episodes': episode_searches, 'seasons': season_searches}
+# arguments of each table's search function, in order
+search_arguments = {'contestants': ('name', 'outcome', 'season', 'min_age', 'max_age'),
+                    'episodes': ('season', 'after', 'before', 'from_date', 'to_date'),
+                    'seasons': ('season', 'winner')}
+
+
+def run_search(backend, table: str, params: dict):
+    """
+    Runs one search against a backend
+    :param backend: object providing search_contestants, search_episodes and search_seasons
+    :param table: contestants, episodes or seasons
+    :param params: search parameters by name; missing ones are None
+    :return: result of the search function
+    """
+    return getattr(backend, 'search_' + table)(*(params.get(argument) for argument in search_arguments[table]))
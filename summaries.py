@@ -0,0 +1,115 @@
+"""Summary tables behind the /stats routes. They are filled when the database is built and kept up to date by
+triggers, so the statistics never need a scan of Contestants or Episodes. Used by database.py."""
+import sqlite3
+from collections import namedtuple
+
+Summary = namedtuple('Summary', ['table', 'source', 'key_columns', 'key_values', 'count_column', 'condition'])
+
+# SQL for the state of a hometown: the text after the last comma, e.g. "UK" for "London, England, UK"
+state_expression = "TRIM(REPLACE({0}, RTRIM({0}, REPLACE({0}, ',', '')), ''))".format('Hometowns.hometown')
+
+# key_values and condition are SQL templates where {row} is the source row: NEW/OLD in triggers, the table at build
+summaries = [
+    Summary(table='HometownStats', source='Contestants', key_columns=['hometown_id INTEGER'],
+            key_values=['{row}.hometown_id'], count_column='contestant_count', condition=None),
+    Summary(table='StateStats', source='Contestants', key_columns=['state TEXT'],
+            key_values=['(SELECT {} FROM Hometowns WHERE Hometowns.id = {{row}}.hometown_id)'.format(state_expression)],
+            count_column='contestant_count', condition=None),
+    Summary(table='SeasonAgeStats', source='Contestants', key_columns=['season INTEGER', 'age INTEGER'],
+            key_values=['{row}.season', '{row}.age'], count_column='contestant_count', condition=None),
+    Summary(table='SeasonEpisodeStats', source='Episodes', key_columns=['season INTEGER'],
+            key_values=['{row}.season'], count_column='episode_count', condition=None),
+    Summary(table='ChallengeWinStats', source='Episodes', key_columns=['contestant_id INTEGER'],
+            key_values=['{row}.winner_id'], count_column='wins', condition='{row}.winner_id IS NOT NULL'),
+]
+# columns of each source table that the summaries depend on
+watched_columns = {'Contestants': 'hometown_id, age, season', 'Episodes': 'winner_id, season'}
+
+# field names and query for each /stats route
+stats_queries = {
+    'hometowns': ('hometown,contestants', '''SELECT Hometowns.hometown, HometownStats.contestant_count
+                  FROM HometownStats JOIN Hometowns ON Hometowns.id = HometownStats.hometown_id
+                  ORDER BY HometownStats.contestant_count DESC, Hometowns.hometown'''),
+    'states': ('state,contestants', '''SELECT state, contestant_count FROM StateStats
+               ORDER BY contestant_count DESC, state'''),
+    'ages': ('season,age,contestants', 'SELECT season, age, contestant_count FROM SeasonAgeStats ORDER BY season, age'),
+    'episodes': ('season,episodes', 'SELECT season, episode_count FROM SeasonEpisodeStats ORDER BY season'),
+    'challenge-wins': ('name,wins', '''SELECT Contestants.name, ChallengeWinStats.wins
+                       FROM ChallengeWinStats JOIN Contestants ON Contestants.id = ChallengeWinStats.contestant_id
+                       ORDER BY ChallengeWinStats.wins DESC, Contestants.name'''),
+}
+
+
+def key_names(summary: Summary) -> list:
+    """
+    :param summary: summary table
+    :return: names of the summary's key columns
+    """
+    return [column.split()[0] for column in summary.key_columns]
+
+
+def add_row_sql(summary: Summary, row: str) -> str:
+    """
+    SQL that counts one more source row in a summary
+    :param summary: summary table
+    :param row: NEW in a trigger
+    :return: SQL statement
+    """
+    names = key_names(summary)
+    condition = summary.condition.format(row=row) if summary.condition else '1'
+    return '''INSERT INTO {table} ({keys}, {count}) SELECT {values}, 1 WHERE {condition}
+              ON CONFLICT ({keys}) DO UPDATE SET {count} = {count} + 1;'''.format(
+        table=summary.table, keys=', '.join(names), count=summary.count_column, condition=condition,
+        values=', '.join(value.format(row=row) for value in summary.key_values))
+
+
+def remove_row_sql(summary: Summary, row: str) -> str:
+    """
+    SQL that counts one less source row in a summary, dropping the summary row when it reaches zero
+    :param summary: summary table
+    :param row: OLD in a trigger
+    :return: SQL statements
+    """
+    match = ' AND '.join('{} = {}'.format(name, value.format(row=row))
+                         for name, value in zip(key_names(summary), summary.key_values))
+    return '''UPDATE {table} SET {count} = {count} - 1 WHERE {match};
+              DELETE FROM {table} WHERE {match} AND {count} <= 0;'''.format(
+        table=summary.table, count=summary.count_column, match=match)
+
+
+def drop_summary_tables(cursor: sqlite3.Cursor):
+    """
+    Drops the summary tables and their triggers
+    :param cursor: cursor of the build transaction
+    """
+    for summary in summaries:
+        cursor.execute('DROP TABLE IF EXISTS {}'.format(summary.table))
+    for source in watched_columns:
+        for event in ('insert', 'delete', 'update'):
+            cursor.execute('DROP TRIGGER IF EXISTS {}_{}_stats'.format(source.lower(), event))
+
+
+def create_summary_tables(cursor: sqlite3.Cursor):
+    """
+    Creates and fills the summary tables, then adds the triggers that keep them up to date when Contestants or
+    Episodes change. Run after the source tables are loaded, so the load itself doesn't fire the triggers.
+    :param cursor: cursor of the build transaction
+    """
+    for summary in summaries:
+        names = ', '.join(key_names(summary))
+        cursor.execute('CREATE TABLE {} ({}, {} INTEGER NOT NULL, PRIMARY KEY ({}))'.format(
+            summary.table, ', '.join(summary.key_columns), summary.count_column, names))
+        values = ', '.join(value.format(row=summary.source) for value in summary.key_values)
+        condition = summary.condition.format(row=summary.source) if summary.condition else '1'
+        cursor.execute('INSERT INTO {} ({}, {}) SELECT {}, COUNT(*) FROM {} WHERE {} GROUP BY {}'.format(
+            summary.table, names, summary.count_column, values, summary.source, condition, values))
+    for source, columns in watched_columns.items():
+        source_summaries = [summary for summary in summaries if summary.source == source]
+        statements = {'insert': [add_row_sql(summary, 'NEW') for summary in source_summaries],
+                      'delete': [remove_row_sql(summary, 'OLD') for summary in source_summaries],
+                      'update': [remove_row_sql(summary, 'OLD') for summary in source_summaries] +
+                                [add_row_sql(summary, 'NEW') for summary in source_summaries]}
+        for event, event_statements in statements.items():
+            cursor.execute('CREATE TRIGGER {}_{}_stats AFTER {} ON {} BEGIN\n{}\nEND'.format(
+                source.lower(), event, event.upper() + (' OF ' + columns if event == 'update' else ''), source,
+                '\n'.join(event_statements)))
@@ -0,0 +1,165 @@
+"""Generates made-up Drag Race data in the schema of the scraped CSV files, so the database and API can be measured on
+datasets much larger than the real one. The same scale and seed always produce the same files. Used by benchmark.py,
+e.g. `python synthetic.py --scale 100 --data-dir data/synthetic`"""
+import argparse
+import csv
+import datetime
+import os
+import random
+from typing import List, Tuple
+from headers import file_headers
+
+# seasons per unit of scale; 1x has as many seasons as the real data
+seasons_per_scale = 13
+# premiere of the first season and of the last; the seasons of every scale are spread evenly between them, so a date
+# range selects the same share of episodes at every scale
+first_premiere = datetime.date(2009, 2, 2)
+last_premiere = datetime.date(2021, 1, 1)
+# contestants per season, like the real seasons
+min_cast, max_cast = 9, 15
+# share of seasons with two contestants tied for a place, and with a disqualified contestant
+tie_rate = 0.15
+disqualified_rate = 0.1
+# share of competitive episodes without a main challenge winner
+no_winner_rate = 0.1
+
+syllables = ['a', 'be', 'cha', 'del', 'di', 'fa', 'gi', 'ja', 'ka', 'la', 'lo', 'ma', 'mon', 'na', 'ni', 'o', 'pa',
+             'ra', 'ri', 'sa', 'sha', 'ta', 'ti', 'va', 'vi', 'xa', 'ya', 'ze', 'zo', 'ne']
+first_names = ['Alexis', 'Bianca', 'Coco', 'Crystal', 'Dida', 'Gia', 'Ginger', 'Honey', 'Jade', 'Jasmine', 'Kennedy',
+               'Lady', 'Latrice', 'Miss', 'Mystique', 'Naomi', 'Nina', 'Pearl', 'Peppermint', 'Ruby', 'Sasha', 'Shea',
+               'Silky', 'Tatianna', 'Trinity', 'Valentina', 'Vanessa', 'Violet', 'Willow', 'Yvie']
+hometowns = ['New York City, New York', 'Los Angeles, California', 'Chicago, Illinois', 'Atlanta, Georgia',
+             'Miami, Florida', 'Orlando, Florida', 'Dallas, Texas', 'Houston, Texas', 'Austin, Texas',
+             'Seattle, Washington', 'Portland, Oregon', 'Denver, Colorado', 'Las Vegas, Nevada', 'Phoenix, Arizona',
+             'Boston, Massachusetts', 'Philadelphia, Pennsylvania', 'Pittsburgh, Pennsylvania', 'Cleveland, Ohio',
+             'Detroit, Michigan', 'Minneapolis, Minnesota', 'Nashville, Tennessee', 'Memphis, Tennessee',
+             'New Orleans, Louisiana', 'San Francisco, California', 'San Diego, California', 'San Juan, Puerto Rico',
+             'Washington, D.C.', 'Baltimore, Maryland', 'Raleigh, North Carolina', 'Salt Lake City, Utah']
+title_words = (['Golden', 'Wicked', 'Royal', 'Glamazon', 'Fierce', 'Electric', 'Sweet', 'Wild'],
+               ['Ball', 'Rusical', 'Ballet', 'Makeover', 'Pageant', 'Roast', 'Talent Show', 'Girl Groups'])
+challenges = ['Design an outfit from thrift store clothes', 'Perform in a horror movie parody',
+              'Write and record a verse for a girl group song', 'Act in a commercial for a new perfume',
+              'Give a family member a drag makeover', 'Host a talk show', 'Roast the judges',
+              'Design an outfit from hardware store materials', 'Perform a stand-up comedy set',
+              'Star in a 1980s music video', 'Impersonate a celebrity in the Snatch Game', 'Sing live in a Rusical']
+# the last two episodes of a season have no challenge winner, like the real finales and reunions
+final_titles = ['Reunited', 'Grand Finale']
+
+
+def ordinal(number: int) -> str:
+    """
+    :param number: place in a season
+    :return: place as it appears in the outcome column, e.g. 3rd
+    """
+    suffix = 'th' if 10 <= number % 100 <= 20 else {1: 'st', 2: 'nd', 3: 'rd'}.get(number % 10, 'th')
+    return str(number) + suffix
+
+
+def make_word(rng: random.Random) -> str:
+    """
+    :param rng: random number generator
+    :return: capitalized made-up word of two or three syllables
+    """
+    return ''.join(rng.choice(syllables) for _ in range(rng.randint(2, 3))).capitalize()
+
+
+def make_name(rng: random.Random, taken: set) -> str:
+    """
+    Makes up a contestant name that isn't taken yet, since episodes and seasons refer to their winner by name
+    :param rng: random number generator
+    :param taken: names already used, which the new name is added to
+    :return: new name
+    """
+    while True:
+        first = rng.choice(first_names) if rng.random() < 0.5 else make_word(rng)
+        name = first + ' ' + make_word(rng)
+        if name not in taken:
+            taken.add(name)
+            return name
+
+
+def make_outcomes(rng: random.Random, cast_size: int) -> List[str]:
+    """
+    Makes the outcomes of a season's cast, in order of placement: Winner, Runner-up, 3rd and so on, with the occasional
+    tie (e.g. 5th/6th) or disqualification
+    :param rng: random number generator
+    :param cast_size: number of contestants
+    :return: list of outcomes
+    """
+    outcomes = ['Winner', 'Runner-up'] + [ordinal(place) for place in range(3, cast_size + 1)]
+    if rng.random() < tie_rate:
+        place = rng.randint(3, cast_size - 1)
+        outcomes[place - 1] = outcomes[place] = '{}/{}'.format(ordinal(place), ordinal(place + 1))
+    if rng.random() < disqualified_rate:
+        outcomes[rng.randint(3, cast_size - 1)] = 'Disqualified'
+    return outcomes
+
+
+def make_season(rng: random.Random, number: int, premiere: datetime.date, taken: set) -> Tuple[list, list]:
+    """
+    Makes up one season: its cast, and an episode a week in which the contestants still competing win challenges
+    :param rng: random number generator
+    :param number: season number
+    :param premiere: date of the first episode
+    :param taken: contestant names already used
+    :return: tuple of contestant rows and episode rows, with the columns of file_headers
+    """
+    cast_size = rng.randint(min_cast, max_cast)
+    names = [make_name(rng, taken) for _ in range(cast_size)]
+    contestants = [(name, min(max(int(rng.gauss(29, 5.5)), 21), 52), rng.choice(hometowns), outcome, number)
+                   for name, outcome in zip(names, make_outcomes(rng, cast_size))]
+    episodes = []
+    for i in range(cast_size - 1):
+        # the contestants placed last are eliminated first, so episode i is contested by the top cast_size - i
+        winner = '' if rng.random() < no_winner_rate else rng.choice(names[:cast_size - i])
+        title = '{} {}'.format(rng.choice(title_words[0]), rng.choice(title_words[1]))
+        date = (premiere + datetime.timedelta(weeks=i)).isoformat()
+        episodes.append((i + 1, title, date, winner, rng.choice(challenges), number))
+    for i, title in enumerate(final_titles, cast_size):
+        episodes.append((i, title, (premiere + datetime.timedelta(weeks=i - 1)).isoformat(), '', '', number))
+    return contestants, episodes
+
+
+def generate(data_dir: str, scale: int = 1, seed: int = 0) -> dict:
+    """
+    Writes contestants.csv, episodes.csv and seasons.csv with `scale` times as many seasons as the real data
+    :param data_dir: directory to write the files to, created if missing
+    :param scale: multiple of the real number of seasons
+    :param seed: seed of the random number generator; the same scale and seed write the same files
+    :return: dictionary with the number of rows written to each file
+    """
+    rng = random.Random(seed)
+    num_seasons = scale * seasons_per_scale
+    days_between = (last_premiere - first_premiere).days / max(num_seasons - 1, 1)
+    os.makedirs(data_dir, exist_ok=True)
+    writers, files = {}, []
+    for table in ('contestants', 'episodes', 'seasons'):
+        fh = open(os.path.join(data_dir, table + '.csv'), 'w', newline='')
+        files.append(fh)
+        writers[table] = csv.writer(fh, lineterminator='\n')
+        fh.write(file_headers[table] + '\n')
+    counts = dict.fromkeys(writers, 0)
+    taken = set()
+    try:
+        for number in range(1, num_seasons + 1):
+            premiere = first_premiere + datetime.timedelta(days=round((number - 1) * days_between))
+            contestants, episodes = make_season(rng, number, premiere, taken)
+            writers['contestants'].writerows(contestants)
+            writers['episodes'].writerows(episodes)
+            writers['seasons'].writerow((number, contestants[0][0]))
+            counts['contestants'] += len(contestants)
+            counts['episodes'] += len(episodes)
+            counts['seasons'] += 1
+    finally:
+        for fh in files:
+            fh.close()
+    return counts
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scale', type=int, default=1, help='multiple of the real number of seasons')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random number generator')
+    parser.add_argument('--data-dir', default='data/synthetic', help='directory to write the CSV files to')
+    cli_args = parser.parse_args()
+    print(generate(cli_args.data_dir, cli_args.scale, cli_args.seed))
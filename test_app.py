@@ -0,0 +1,68 @@
+"""Tests of the Flask routes, against drag_race.db. Run from the project root with `python -m pytest test_app.py` or
+`python -m unittest test_app`"""
+import unittest
+
+import app
+
+
+class PagingTest(unittest.TestCase):
+    def setUp(self):
+        self.client = app.app.test_client()
+
+    def test_out_of_range_after_id_is_ignored(self):
+        first_page = self.client.get('/all/contestants?limit=2').get_json()
+        for after_id in ('99999999999999999999', '-99999999999999999999'):
+            with self.subTest(after_id=after_id):
+                response = self.client.get('/all/contestants?limit=2&after_id=' + after_id)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.get_json(), first_page)
+
+    def test_pages_follow_next_after_id(self):
+        rows = []
+        url = '/search/contestants?season=4&limit=5'
+        page = self.client.get(url).get_json()
+        while True:
+            rows += page['contestants']
+            if page['next_after_id'] is None:
+                break
+            page = self.client.get('{}&after_id={}'.format(url, page['next_after_id'])).get_json()
+        self.assertEqual(rows, self.client.get('/search/contestants?season=4').get_json()['contestants'])
+
+    def test_columns_format_of_a_page(self):
+        for url in ('/all/episodes?limit=3', '/search/contestants?season=4&limit=2'):
+            with self.subTest(url=url):
+                rows = self.client.get(url).get_json()
+                columns = self.client.get(url + '&format=columns').get_json()
+                self.assertEqual(columns['next_after_id'], rows['next_after_id'])
+                key = next(key for key in rows if key != 'next_after_id')
+                fields = sorted(rows[key][0])
+                self.assertEqual(sorted(columns[key]), fields)
+                self.assertEqual([dict(zip(fields, values)) for values in zip(*(columns[key][field]
+                                                                                for field in fields))], rows[key])
+
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        self.client = app.app.test_client()
+
+    def test_results_match_searches(self):
+        specs = [{'table': 'contestants', 'params': {'season': 4}},
+                 {'table': 'contestants', 'params': {'season': '99999999999999999999'}},
+                 {'table': 'contestants', 'params': {'season': 5, 'min_age': 30}},
+                 {'table': 'episodes', 'params': {'season': '2-3'}},
+                 {'table': 'seasons', 'params': {'winner': 'raja'}}]
+        response = self.client.post('/batch', json=specs)
+        self.assertEqual(response.status_code, 200)
+        for spec, result in zip(specs, response.get_json()['results']):
+            query = '&'.join('{}={}'.format(name, value) for name, value in spec['params'].items())
+            with self.subTest(spec=spec):
+                self.assertEqual(result, self.client.get('/search/{}?{}'.format(spec['table'], query)).get_json())
+
+    def test_invalid_specs(self):
+        for specs in ([], {'table': 'seasons'}, [{'table': 'judges'}], [{'table': 'seasons', 'params': 4}]):
+            with self.subTest(specs=specs):
+                self.assertEqual(self.client.post('/batch', json=specs).status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+"""Tests that the ASGI app answers like the Flask app, against drag_race.db. Run from the project root with
+`python -m pytest test_asgi.py` or `python -m unittest test_asgi`"""
+import asyncio
+import json
+import unittest
+from urllib.parse import urlsplit
+
+import app
+import asgi
+
+# a request to each rule of app.url_map, with invalid values in its path, and paths the rules don't match
+paths = ['/', '/metrics', '/franchises', '/franchises/', '/nothing', '/all', '/all/', '/all/judges',
+         '/all/contestants', '/all/contestants/', '/all//contestants', '/all/episodes?limit=3&after_id=5',
+         '/all/seasons?stream=ndjson', '/all/contestants?stream=json&limit=4', '/all/contestants?format=columns',
+         '/us/all/seasons?limit=2', '/xx/all/seasons', '/us/all/judges', '/stats/ages', '/stats/ages/',
+         '/stats/judges', '/us/stats/hometowns', '/xx/stats/hometowns', '/us/stats/judges', '/search/contestants',
+         '/search/contestants?season=4', '/search/contestants/?season=4', '/search/judges?season=4',
+         '/search/episodes?season=2-3&limit=2', '/us/search/seasons?season=1-3&stream=json',
+         '/xx/search/seasons?season=1', '/franchises/search/contestants?season=4', '/franchises/search/judges',
+         '/autocomplete?name=raj', '/autocomplete/?name=raj', '/us/autocomplete?name=mon&limit=2',
+         '/xx/autocomplete?name=mon', '/formsearch/contestants', '/formsearch/judges', '/batch', '/batch/',
+         '/static/nothing.css', '/static/../app.py']
+methods = ['GET', 'HEAD', 'POST', 'PUT', 'OPTIONS']
+
+
+async def call(method: str, url: str, body: bytes = b'', headers: tuple = ()) -> tuple:
+    """
+    Sends a request to the ASGI app
+    :param method: request method
+    :param url: path and query string
+    :param body: request body
+    :param headers: request headers, as pairs of bytes
+    :return: status, headers and body of the response
+    """
+    parts = urlsplit(url)
+    scope = {'type': 'http', 'method': method, 'path': parts.path, 'query_string': parts.query.encode(),
+             'headers': [(b'host', b'localhost')] + list(headers)}
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': body, 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await asgi.app(scope, receive, send)
+    return (messages[0]['status'], dict(messages[0]['headers']),
+            b''.join(message.get('body', b'') for message in messages[1:]))
+
+
+class RouteParityTest(unittest.TestCase):
+    def setUp(self):
+        self.client = app.app.test_client()
+
+    def assert_same_response(self, method: str, url: str, body: bytes = b'', content_type: str = None):
+        headers = ((b'content-type', content_type.encode()),) if content_type else ()
+        status, asgi_headers, asgi_body = asyncio.run(call(method, url, body, headers))
+        response = self.client.open(url, method=method, data=body, content_type=content_type)
+        self.assertEqual(status, response.status_code)
+        # the metrics count the requests made so far, so they are not the same for both apps
+        if not url.startswith('/metrics'):
+            self.assertEqual(asgi_body, response.data)
+        for name in ('Content-Type', 'Location', 'ETag'):
+            value = asgi_headers.get(name.lower().encode())
+            self.assertEqual(value.decode() if value else None, response.headers.get(name), name)
+        # Flask lists the allowed methods in no particular order
+        self.assertEqual(set(asgi_headers.get(b'allow', b'').decode().split(', ')) - {''}, set(response.allow))
+
+    def test_routes(self):
+        for url in paths:
+            for method in methods:
+                with self.subTest(method=method, url=url):
+                    self.assert_same_response(method, url)
+
+    def test_static_file(self):
+        status, headers, body = asyncio.run(call('GET', '/static/styles/styles.css'))
+        response = self.client.get('/static/styles/styles.css')
+        # Flask also sends the file's caching headers, which the ASGI app leaves out
+        self.assertEqual((status, headers[b'content-type'].decode(), body),
+                         (response.status_code, response.content_type, response.data))
+        response.close()
+
+    def test_posts(self):
+        specs = json.dumps([{'table': 'contestants', 'params': {'season': 4}}]).encode()
+        for url, body, content_type in (('/batch', specs, 'application/json'), ('/batch', specs, 'text/plain'),
+                                        ('/batch', b'[{"table": "judges"}]', 'application/json'),
+                                        ('/formsearch/seasons', b'season=4', 'application/x-www-form-urlencoded'),
+                                        ('/formsearch/judges', b'season=4', 'application/x-www-form-urlencoded')):
+            with self.subTest(url=url, body=body, content_type=content_type):
+                self.assert_same_response('POST', url, body, content_type)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+"""Checks that the columnar backend returns the same rows as SQLite, on the real data and on synthetic data. Run from
+the project root with `python -m pytest test_backends.py` or `python -m unittest test_backends`"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import synthetic
+from columnar import ColumnarBackend
+from database import Database
+from search_cases import benchmark_searches, run_search, search_arguments
+
+# integers outside SQLite's 64-bit range, which both backends treat as invalid parameters
+out_of_range_searches = {'contestants': [{'season': '99999999999999999999-99999999999999999999'},
+                                         {'season': '9223372036854775807-9223372036854775808'},
+                                         {'season': '1,99999999999999999999'}, {'season': '99999999999999999999'},
+                                         {'min_age': '99999999999999999999'}, {'max_age': '-99999999999999999999'},
+                                         {'season': '4', 'min_age': '99999999999999999999'}],
+                         'episodes': [{'season': '1-99999999999999999999'}],
+                         'seasons': [{'season': '99999999999999999999,1'}]}
+
+
+class BackendParityTest(unittest.TestCase):
+    @classmethod
+    def make_data_dir(cls, tmp_dir: str) -> str:
+        """
+        :param tmp_dir: temporary directory of the test class
+        :return: directory of the CSV files to build the database from
+        """
+        return 'data'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.db = Database(os.path.join(cls.tmp_dir, 'parity.db'), data_dir=cls.make_data_dir(cls.tmp_dir))
+        cls.db.create_database()
+        cls.columnar = ColumnarBackend(cls.db)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db.pool.close_all()
+        shutil.rmtree(cls.tmp_dir)
+
+    def test_select_all(self):
+        for table in benchmark_searches:
+            with self.subTest(table=table):
+                self.assertEqual(self.db.select_all(table), self.columnar.select_all(table))
+
+    def test_searches(self):
+        for table, searches in benchmark_searches.items():
+            for params in searches:
+                with self.subTest(table=table, params=params):
+                    self.assertEqual(run_search(self.db, table, params), run_search(self.columnar, table, params))
+
+    def test_out_of_range_integers(self):
+        for table, searches in out_of_range_searches.items():
+            for params in searches:
+                with self.subTest(table=table, params=params):
+                    self.assertEqual(run_search(self.db, table, params), run_search(self.columnar, table, params))
+        self.assertIsNone(run_search(self.db, 'contestants', out_of_range_searches['contestants'][0]))
+        self.assertEqual(run_search(self.db, 'contestants', {'season': '4', 'min_age': '99999999999999999999'}),
+                         run_search(self.db, 'contestants', {'season': '4'}))
+
+    def test_batch_matches_single_searches(self):
+        for table, searches in benchmark_searches.items():
+            searches = searches + out_of_range_searches[table]
+            arg_lists = [[params.get(argument) for argument in search_arguments[table]] for params in searches]
+            self.db.search_cache.clear()
+            expected = [run_search(self.db, table, params) for params in searches]
+            # merged searches would otherwise be answered from the results cached above
+            self.db.search_cache.clear()
+            with self.subTest(table=table):
+                self.assertEqual(self.db.batch_search(table, arg_lists), expected)
+
+    def test_batch_search(self):
+        for table, searches in benchmark_searches.items():
+            arg_lists = [[params.get(argument) for argument in search_arguments[table]] for params in searches]
+            with self.subTest(table=table):
+                self.assertEqual(self.db.batch_search(table, arg_lists), self.columnar.batch_search(table, arg_lists))
+
+
+class SyntheticParityTest(BackendParityTest):
+    @classmethod
+    def make_data_dir(cls, tmp_dir: str) -> str:
+        data_dir = os.path.join(tmp_dir, 'data')
+        synthetic.generate(data_dir, scale=3)
+        return data_dir
+
+
+class ReloadTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db = Database(os.path.join(self.tmp_dir, 'reload.db'))
+        self.db.create_database()
+        self.columnar = ColumnarBackend(self.db)
+
+    def tearDown(self):
+        self.db.pool.close_all()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_sync_reloads_columnar(self):
+        contestants = self.db.contestant_df
+        contestants.loc[contestants['name'] == 'Raja', 'age'] = 99
+        self.db.contestant_df = contestants
+        self.db.sync_database()
+        for table in benchmark_searches:
+            with self.subTest(table=table):
+                self.assertEqual(self.db.select_all(table), self.columnar.select_all(table))
+        self.assertEqual(self.columnar.search_contestants('Raja', None, '3', None, None)[0][1], 99)
+
+
+if __name__ == '__main__':
+    unittest.main()
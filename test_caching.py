@@ -0,0 +1,68 @@
+"""Tests of the search result cache. Run from the project root with `python -m pytest test_caching.py` or
+`python -m unittest test_caching`"""
+import unittest
+from unittest import mock
+
+from caching import LRUCache
+from database import Database
+
+
+class LRUCacheTest(unittest.TestCase):
+    def test_entries_expire_after_ttl(self):
+        cache = LRUCache(maxsize=4, ttl=10)
+        with mock.patch('caching.time.monotonic', return_value=100.0):
+            cache.put('season=4', ['rows'])
+        with mock.patch('caching.time.monotonic', return_value=109.9):
+            self.assertEqual(cache.get('season=4'), ['rows'])
+        with mock.patch('caching.time.monotonic', return_value=110.0):
+            self.assertIsNone(cache.get('season=4'))
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1, 'evictions': 0, 'size': 0})
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = LRUCache(maxsize=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        # reading 'a' makes 'b' the least recently used
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual(cache.stats()['size'], 2)
+
+    def test_clear_keeps_counters(self):
+        cache = LRUCache()
+        cache.put('a', 1)
+        cache.get('a')
+        cache.clear()
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1, 'evictions': 0, 'size': 0})
+
+
+class SearchCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.db = Database()
+        self.db.search_cache.clear()
+
+    def tearDown(self):
+        self.db.pool.close_all()
+
+    def test_equivalent_outcomes_share_an_entry(self):
+        before = self.db.search_cache.stats()
+        results = [self.db.search_contestants(None, outcome, None, None, None)
+                   for outcome in ('winner', 'Winner', '1', '1st')]
+        after = self.db.search_cache.stats()
+        self.assertTrue(results[0])
+        self.assertTrue(all(result == results[0] for result in results))
+        self.assertEqual(after['size'], 1)
+        self.assertEqual((after['misses'] - before['misses'], after['hits'] - before['hits']), (1, 3))
+
+    def test_reload_invalidates(self):
+        self.db.search_contestants(None, None, '4', None, None)
+        self.assertEqual(self.db.search_cache.stats()['size'], 1)
+        self.db.reload()
+        self.assertEqual(self.db.search_cache.stats()['size'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
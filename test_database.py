@@ -0,0 +1,101 @@
+"""Tests of the database file handling: snapshots, paging and syncing. Run from the project root with
+`python -m pytest test_database.py` or `python -m unittest test_database`"""
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from database import Database, kept_snapshots
+from name_index import NameIndex
+from summaries import stats_queries
+
+
+class SnapshotPagingTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        db_name = os.path.join(self.tmp_dir, 'paging.db')
+        self.builder = Database(db_name, snapshots=True)
+        self.builder.create_database()
+        # a server that has read the first snapshot
+        self.served = Database(db_name, snapshots=True)
+        self.first_snapshot = self.served.pool.db_name
+        self.expected = list(self.served.iter_rows('contestants', limit=2))
+
+    def tearDown(self):
+        self.builder.pool.close_all()
+        self.served.pool.close_all()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_pages_after_old_snapshots_are_removed(self):
+        for _ in range(kept_snapshots + 1):
+            self.builder.publish_snapshot()
+        self.assertFalse(os.path.exists(self.first_snapshot))
+        # a thread without a pooled connection yet opens whichever file the pool points at
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            rows = executor.submit(lambda: list(self.served.iter_rows('contestants', limit=2))).result()
+        self.assertEqual(rows, self.expected)
+        self.assertNotEqual(self.served.pool.db_name, self.first_snapshot)
+
+
+class SyncTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.built = Database(os.path.join(self.tmp_dir, 'built.db'))
+        self.built.create_database()
+        self.synced = Database(os.path.join(self.tmp_dir, 'synced.db'))
+        contestants, episodes = self.synced.contestant_df, self.synced.episode_df
+        last_season = contestants['season'].max()
+        # an older version of the data: without the last season, with a contestant missing and another one's age
+        # and an episode's title changed
+        old_contestants = contestants[(contestants['season'] < last_season) & (contestants['name'] != 'Raja')].copy()
+        old_contestants.loc[old_contestants['name'] == 'Jinkx Monsoon', 'age'] = 99
+        old_episodes = episodes[episodes['season'] < last_season].copy()
+        old_episodes.loc[old_episodes.index[0], 'title'] = 'Old title'
+        self.synced.contestant_df, self.synced.episode_df = old_contestants, old_episodes
+        self.synced.create_database()
+        self.old_index = self.synced.name_index
+        self.synced.contestant_df, self.synced.episode_df = contestants, episodes
+        self.changes = self.synced.sync_database()
+
+    def tearDown(self):
+        self.built.pool.close_all()
+        self.synced.pool.close_all()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_same_rows_as_create_database(self):
+        self.assertTrue(self.changes['contestants']['upserted'])
+        for table in ('contestants', 'episodes', 'seasons'):
+            with self.subTest(table=table):
+                # rows added by the sync get new IDs, so they may come in another order
+                self.assertEqual(sorted(self.synced.select_all(table), key=repr),
+                                 sorted(self.built.select_all(table), key=repr))
+
+    def test_same_summary_tables_as_create_database(self):
+        for name in stats_queries:
+            with self.subTest(name=name):
+                self.assertEqual(sorted(self.synced.select_stats(name), key=repr),
+                                 sorted(self.built.select_stats(name), key=repr))
+
+    def test_name_index_matches_a_fresh_index(self):
+        fresh = NameIndex(self.synced.pool.connection().execute('SELECT id, name FROM Contestants ORDER BY id'))
+        index = self.synced.name_index
+        # Raja and the last season were added after the other names, so the index was extended, not rebuilt
+        self.assertIs(index.grams[0], self.old_index.grams[0])
+        for attribute in ('row_ids', 'names', 'folded', 'grams', 'postings', 'char_postings', 'word_starts'):
+            with self.subTest(attribute=attribute):
+                self.assertEqual(getattr(index, attribute), getattr(fresh, attribute))
+        for query in ('raja', 'mon', 'Monsoom', 'x', 'sharon needles'):
+            with self.subTest(query=query):
+                self.assertEqual(index.search(query), fresh.search(query))
+
+    def test_name_index_shares_unchanged_names(self):
+        index = self.synced.name_index
+        index.search('raja')
+        self.synced.reload()
+        self.assertIsNot(self.synced.name_index, index)
+        self.assertIs(self.synced.name_index.search, index.search)
+
+
+if __name__ == '__main__':
+    unittest.main()
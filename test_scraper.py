@@ -0,0 +1,94 @@
+"""Tests of the scraper, run offline against the saved Wikipedia pages in fixtures/. The pages are parsed with
+html.parser and, if it is installed, lxml. Run from the project root with `python -m pytest test_scraper.py` or
+`python -m unittest test_scraper`"""
+import csv
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import scraper
+from franchises import default_franchise, franchises
+
+project_dir = os.path.dirname(os.path.abspath(__file__))
+fixture_dir = os.path.join(project_dir, 'fixtures')
+# fixtures/ holds the season pages of the first two seasons and the contestants page, trimmed down to the tables the
+# scraper reads and to the rows of those seasons
+fixture_seasons = ('1', '2')
+parsers = ('html.parser', 'lxml')
+
+
+def read_csv(file_name: str) -> list:
+    """
+    Reads the rows of a CSV file
+    :param file_name: path of the file
+    :return: list of rows, the header row first
+    """
+    with open(file_name, encoding='utf-8-sig', newline='') as fh:
+        return list(csv.reader(fh))
+
+
+class FixturePageTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        info = franchises[default_franchise]
+        self.franchise = scraper.Franchise(info.name, len(fixture_seasons), info.season_url,
+                                           os.path.join(self.tmp_dir, 'data'))
+        # an offline page cache holding the saved pages, as an earlier online run would have left it
+        self.cache = scraper.PageCache(os.path.join(self.tmp_dir, 'html_cache'), offline=True)
+        os.makedirs(self.cache.directory)
+        pages = {url: 'season_{}.html'.format(season) for url, season in zip(self.franchise.season_urls(),
+                                                                              fixture_seasons)}
+        pages[scraper.contestants_url] = 'contestants.html'
+        for url, file_name in pages.items():
+            path = self.cache.path(url)
+            shutil.copy(os.path.join(fixture_dir, file_name), path + '.html')
+            with open(path + '.json', 'w') as fh:
+                json.dump({'url': url, 'etag': None, 'last_modified': None}, fh)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def parsers(self):
+        """
+        Runs the body of a loop once with each HTML parser the scraper can use, skipping lxml if it isn't installed
+        :return: iterator of parser names
+        """
+        for parser in parsers:
+            with self.subTest(parser=parser), mock.patch('scraper.html_parser', parser):
+                if importlib.util.find_spec(parser.split('.')[0]) is None:
+                    self.skipTest('{} is not installed'.format(parser))
+                yield parser
+
+    def test_season_pages(self):
+        data_dir = os.path.join(project_dir, 'data')
+        episodes = [row for row in read_csv(os.path.join(data_dir, 'episodes.csv')) if row[-1] in fixture_seasons]
+        seasons = [row for row in read_csv(os.path.join(data_dir, 'seasons.csv')) if row[0] in fixture_seasons]
+        for _ in self.parsers():
+            self.franchise.get_season_data(self.cache)
+            self.assertEqual(read_csv(os.path.join(self.franchise.data_dir, 'episodes1.csv'))[1:], episodes)
+            self.assertEqual(read_csv(os.path.join(self.franchise.data_dir, 'seasons.csv'))[1:], seasons)
+
+    def test_contestants_page(self):
+        # the contestant rows are written joined with commas, without quoting, and with the season's name
+        expected = ['name,age,hometown,outcome,season'] + [
+            ','.join(row[:-1] + ['Season ' + row[-1]])
+            for row in read_csv(os.path.join(project_dir, 'data', 'contestants.csv'))[1:] if row[-1] in fixture_seasons]
+        working_dir = os.getcwd()
+        # get_contestant_data writes to data/ in the working directory
+        os.chdir(self.tmp_dir)
+        os.makedirs('data')
+        try:
+            for _ in self.parsers():
+                scraper.get_contestant_data(self.cache)
+                with open(os.path.join('data', 'constestants2.csv')) as fh:
+                    self.assertEqual(fh.read().splitlines(), expected)
+        finally:
+            os.chdir(working_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()